@@ -1 +1 @@
-from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob, GEDAGJob
@@ -0,0 +1,288 @@
+import os
+from os import path
+import mmap
+import operator
+import struct
+import tempfile
+import threading
+
+MAGIC = "GEARGTB1"
+HEADER = struct.Struct("<8sII")
+AXIS = struct.Struct("<QQ")
+OFFSET = struct.Struct("<Q")
+
+ZIP = 0
+PRODUCT = 1
+
+
+def table_length(lengths, mode=ZIP):
+    if not lengths:
+        return 0
+    if mode == PRODUCT:
+        return reduce(operator.mul, lengths, 1)
+    return min(lengths)
+
+
+def write_table(axes, directory='.', prefix="args.", mode=ZIP):
+    """Write argument axes into a new table file and return its absolute path.
+
+    Each axis is stored as its values followed by an offset index,
+    so that any value can be read without scanning the file.
+    In ZIP mode row i takes the i-th value of every axis; in PRODUCT mode
+    rows enumerate the Cartesian product of the axes in `itertools.product` order.
+    """
+    axes = [[str(x) for x in axis] for axis in axes]
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tablepath = tempfile.mkstemp(suffix=".argtable", prefix=prefix, dir=directory)
+
+    with os.fdopen(fd, "wb") as f:
+        f.write(HEADER.pack(MAGIC, mode, len(axes)))
+        axis_pos = f.tell()
+        f.write('\0' * (AXIS.size * len(axes)))
+
+        entries = []
+        for axis in axes:
+            data_pos = f.tell()
+            offsets = [data_pos]
+            for value in axis:
+                f.write(value)
+                offsets.append(offsets[-1] + len(value))
+            index_pos = f.tell()
+            f.write(struct.pack("<{}Q".format(len(offsets)), *offsets))
+            entries.append(AXIS.pack(len(axis), index_pos))
+
+        f.seek(axis_pos)
+        f.write(''.join(entries))
+
+    return path.abspath(tablepath)
+
+
+class ArgTable(object):
+    """Read-only, memory-mapped view of a table written by `write_table`.
+
+    `table[i]` returns the i-th row (a tuple with one value per axis).
+    """
+
+    def __init__(self, tablepath):
+        with open(tablepath, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.mode, naxes = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise IOError("Not an argument table: {}".format(tablepath))
+
+        self.axes = [AXIS.unpack_from(self._map, HEADER.size + AXIS.size * i) for i in xrange(naxes)]
+        self._length = table_length([count for count, _ in self.axes], self.mode)
+
+    def __len__(self):
+        return self._length
+
+    def value(self, axis, i):
+        _, index_pos = self.axes[axis]
+        start, = OFFSET.unpack_from(self._map, index_pos + OFFSET.size * i)
+        end, = OFFSET.unpack_from(self._map, index_pos + OFFSET.size * (i + 1))
+        return self._map[start:end]
+
+    def row(self, i):
+        if not 0 <= i < self._length:
+            raise IndexError("row {} out of range".format(i))
+        if self.mode == PRODUCT:
+            indices = []
+            for count, _ in reversed(self.axes):
+                i, digit = divmod(i, count)
+                indices.append(digit)
+            indices.reverse()
+        else:
+            indices = [i] * len(self.axes)
+        return tuple(self.value(axis, j) for axis, j in enumerate(indices))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in xrange(*i.indices(self._length))]
+        if i < 0:
+            i += self._length
+        return self.row(i)
+
+    def close(self):
+        self._map.close()
+
+
+def task_slice(number, ntasks, length):
+    """Return (start, stop) of the rows run by task `number` (0-based) of `ntasks`."""
+    start = length * number // ntasks
+    if number == ntasks - 1:
+        return start, length
+    return start, length * (number + 1) // ntasks
+
+
+def write_rows(rows, directory='.', prefix="rows."):
+    """Write a list of row numbers, e.g. rows to run again, and return the file's absolute path."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, rowspath = tempfile.mkstemp(suffix=".rows", prefix=prefix, dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        for i in xrange(0, len(rows), 4096):
+            chunk = rows[i:i+4096]
+            f.write(struct.pack("<{}Q".format(len(chunk)), *chunk))
+    return path.abspath(rowspath)
+
+
+class RowList(object):
+    """Read-only view of a file written by `write_rows`."""
+
+    def __init__(self, rowspath):
+        with open(rowspath, "rb") as f:
+            self._data = f.read()
+        self._length = len(self._data) // OFFSET.size
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._length:
+            raise IndexError("row {} out of range".format(i))
+        return OFFSET.unpack_from(self._data, OFFSET.size * i)[0]
+
+
+class RowSlots(object):
+    """File of fixed-size records, one slot per table row at offset `size * row`.
+
+    Tasks of an array job write only the slots of their own rows, so one file
+    serves the whole array. Slots whose first field is 0 have not been written.
+    """
+
+    RECORD = None
+
+    def __init__(self, slotpath):
+        self.path = slotpath
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _write(self, row, values):
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+            os.lseek(self._fd, self.RECORD.size * row, os.SEEK_SET)
+            os.write(self._fd, self.RECORD.pack(*values))
+
+    def _read(self, length):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read(self.RECORD.size * length)
+        except IOError:
+            data = ''
+        records = [self.RECORD.unpack_from(data, offset)
+                   for offset in xrange(0, len(data) - self.RECORD.size + 1, self.RECORD.size)]
+        return [values if values[0] else None for values in records] + [None] * (length - len(records))
+
+    def _read_rows(self, rows):
+        """Like `_read`, for the given rows only; consecutive rows are read with one seek."""
+        try:
+            f = open(self.path, "rb")
+        except IOError:
+            return [None] * len(rows)
+
+        size = self.RECORD.size
+        records = []
+        with f:
+            i = 0
+            while i < len(rows):
+                j = i + 1
+                while j < len(rows) and rows[j] == rows[j-1] + 1:
+                    j += 1
+                f.seek(size * rows[i])
+                data = f.read(size * (j - i))
+                for offset in xrange(0, size * (j - i), size):
+                    values = self.RECORD.unpack_from(data, offset) if offset + size <= len(data) else None
+                    records.append(values if values and values[0] else None)
+                i = j
+        return records
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class TaskStatus(RowSlots):
+    """Exit status of each table row, written by arrayrunner.py as rows finish.
+
+    Each slot holds the exit status plus one, so rows which never ran read as None.
+    """
+
+    RECORD = struct.Struct("<i")
+
+    def set(self, row, code):
+        self._write(row, (code + 1,))
+
+    def read(self, length):
+        """Return the exit status of rows 0 to `length`-1 (None if not run)."""
+        return [values[0] - 1 if values else None for values in self._read(length)]
+
+    def read_rows(self, rows):
+        """Return the exit status of each of `rows` (None if not run), reading only their slots."""
+        return [values[0] - 1 if values else None for values in self._read_rows(rows)]
+
+
+class TaskStats(RowSlots):
+    """Resource usage of each table row, written by arrayrunner.py with `--stats`.
+
+    Wall, user and system time are in seconds, maxrss in kilobytes as
+    reported by getrusage, start in seconds since the epoch.
+    """
+
+    RECORD = struct.Struct("<iIddddq40s")
+    FIELDS = ("exit_status", "task", "start", "wall", "utime", "stime", "maxrss", "host")
+
+    def set(self, row, exit_status, task, start, wall, utime, stime, maxrss, host):
+        self._write(row, (exit_status + 1, task, start, wall, utime, stime, maxrss, host[:40]))
+
+    def read(self, length):
+        """Return a dict per row 0 to `length`-1 (None if not run)."""
+        stats = []
+        for values in self._read(length):
+            if values is None:
+                stats.append(None)
+                continue
+            record = dict(zip(self.FIELDS, values))
+            record["exit_status"] -= 1
+            record["host"] = record["host"].rstrip('\0')
+            stats.append(record)
+        return stats
+
+
+def chunk_path(directory, chunk):
+    return path.join(directory, "chunk.{}".format(chunk))
+
+
+class OutputIndex(RowSlots):
+    """Where the captured output of each table row is stored.
+
+    A row's stdout followed by its stderr is one block in a chunk file
+    shared by a range of tasks; the slot holds the chunk number, the block's
+    offset and the lengths of both parts.
+    """
+
+    RECORD = struct.Struct("<iQQQ")
+
+    def set(self, row, chunk, offset, stdout_length, stderr_length):
+        self._write(row, (chunk + 1, offset, stdout_length, stderr_length))
+
+    def read(self, length):
+        """Return (chunk, offset, stdout length, stderr length) per row 0 to `length`-1 (None if not run)."""
+        return [(values[0] - 1,) + values[1:] if values else None for values in self._read(length)]
+
+    def get(self, row):
+        """Read the slot of one row without reading the rest of the index."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.RECORD.size * row)
+                data = f.read(self.RECORD.size)
+        except IOError:
+            return None
+        if len(data) < self.RECORD.size:
+            return None
+        values = self.RECORD.unpack(data)
+        return (values[0] - 1,) + values[1:] if values[0] else None
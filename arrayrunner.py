@@ -1,43 +1,150 @@
 #!/usr/bin/env python
 import argparse
 import os
+import sys
+import resource
+from os import path
+import errno
+import fcntl
+import time
+import socket
+import tempfile
+import threading
 import subprocess
 import shlex
+from multiprocessing.pool import ThreadPool
+
+from argtable import ArgTable, RowList, TaskStatus, TaskStats, OutputIndex, task_slice, chunk_path
+
+# exit status of a row whose command could not be started, as in the shell
+NOT_STARTED = 127
 
 
 def _main():
     parser = argparse.ArgumentParser(description='Array Job Runner. Try all argument combinations')
+    parser.add_argument("--table", required=True, help="Argument table written by GEArrayJob")
+    parser.add_argument("--status", help="File receiving the exit status of each table row")
+    parser.add_argument("--rows", help="Run only the table rows listed in this file")
+    parser.add_argument("--skip-done", action="store_true", help="Skip rows whose recorded exit status is 0")
+    parser.add_argument("--stats", help="File receiving the resource usage of each table row")
+    parser.add_argument("--output", help="Directory collecting the stdout/stderr of all rows")
+    parser.add_argument("--chunk-tasks", type=int, default=1000, help="Tasks sharing one output chunk file")
     parser.add_argument("commands", nargs=argparse.REMAINDER, help="Job command")
 
-    for i in range(1, 100):
-        meta = "-{}".format(i)
-        dest = "a{}".format(i)
-        helpstr = "Argument {}".format(i)
-        parser.add_argument(meta, dest=dest, nargs="+", help=helpstr, default=None)
-
     options = parser.parse_args()
     exit_status = 0
 
-    args = tuple(getattr(options, "a{}".format(i)) for i in range(1, 100)
-                 if getattr(options, "a{}".format(i)) is not None)
-
-    if not args:
-        combinations = ()
-    else:
-        combinations = zip(*args)
-
-    arg = slice_by_jobnumber(combinations)[0]
-
+    combinations = ArgTable(options.table)
     command_template = ' '.join(options.commands[1:])
-    commandline = shlex.split(command_template.format(*([None]+list(arg))))
-    this_exit = subprocess.call(commandline)
+    status = TaskStatus(options.status) if options.status else None
+    stats = TaskStats(options.stats) if options.stats else None
+    task_id = os.environ.get("SGE_TASK_ID", '')
+    task = int(task_id) if task_id.isdigit() else 0
+    host = socket.gethostname()
 
-    exit_status = max(exit_status, this_exit)
+    if options.output:
+        try:
+            os.makedirs(options.output)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        index = OutputIndex(path.join(options.output, "index"))
+        writer = ChunkWriter(options.output, max(0, task - 1) // options.chunk_tasks)
+
+    rows = rows_by_jobnumber(RowList(options.rows) if options.rows else xrange(len(combinations)))
+    if options.skip_done and status is not None:
+        rows = [row for row, code in zip(rows, status.read_rows(rows)) if code != 0]
+
+    def run_row(row):
+        start = time.time()
+        if options.output:
+            stdout, stderr = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+            try:
+                code, usage = run_combination(command_template, combinations[row], stdout, stderr)
+                offset, (stdout_length, stderr_length) = writer.append(stdout, stderr)
+            finally:
+                stdout.close()
+                stderr.close()
+            index.set(row, writer.chunk, offset, stdout_length, stderr_length)
+        else:
+            code, usage = run_combination(command_template, combinations[row])
+        if code < 0:
+            code = 128 - code  # killed by a signal
+        if status is not None:
+            status.set(row, code)
+        if stats is not None:
+            stats.set(row, code, task, start, time.time() - start, usage.ru_utime, usage.ru_stime, usage.ru_maxrss, host)
+        return code
+
+    pool = ThreadPool(min(get_slots(), len(rows)) or 1)
+    try:
+        exits = pool.map(run_row, rows)
+    finally:
+        pool.close()
+        pool.join()
+
+    for this_exit in exits:
+        exit_status = max(exit_status, this_exit)
 
     # exit(100)
     exit(exit_status)
 
 
+def run_combination(command_template, arg, stdout=None, stderr=None):
+    """Run one combination; return its exit status (negative if killed by a signal) and its rusage."""
+    commandline = shlex.split(command_template.format(*([None]+list(arg))))
+    try:
+        process = subprocess.Popen(commandline, stdout=stdout, stderr=stderr)
+    except OSError as e:
+        (stderr or sys.stderr).write("arrayrunner.py: cannot run {}: {}\n".format(commandline[0], e.strerror))
+        return NOT_STARTED, resource.struct_rusage((0,) * 16)
+    while True:
+        try:
+            _, wait_status, usage = os.wait4(process.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    process.returncode = -os.WTERMSIG(wait_status) if os.WIFSIGNALED(wait_status) else os.WEXITSTATUS(wait_status)
+    return process.returncode, usage
+
+
+class ChunkWriter(object):
+    """Appends captured outputs to the chunk file shared by a range of tasks."""
+
+    def __init__(self, directory, chunk):
+        self.chunk = chunk
+        self.fd = os.open(chunk_path(directory, chunk), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.lock = threading.Lock()
+
+    def append(self, *files):
+        """Append the contents of `files` as one block; return its offset and the length of each part."""
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                offset = os.lseek(self.fd, 0, os.SEEK_END)
+                lengths = []
+                for f in files:
+                    f.seek(0)
+                    length = 0
+                    for block in iter(lambda: f.read(1 << 20), ''):
+                        while block:
+                            written = os.write(self.fd, block)
+                            block = block[written:]
+                            length += written
+                    lengths.append(length)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        return offset, lengths
+
+
+def get_slots():
+    try:
+        return max(1, int(os.environ.get("NSLOTS", 1)))
+    except ValueError:
+        return 1
+
+
 def get_job_number():
     job_number = 0
     number_of_jobs = 1
@@ -56,12 +163,10 @@ def get_job_number():
     return (job_number, number_of_jobs)
 
 
-def slice_by_jobnumber(sequence):
+def rows_by_jobnumber(rows):
     num, jobs = get_job_number()
-    size = float(len(sequence)) / jobs
-    if num != jobs-1:
-        return sequence[int(size*num):int(size*(num+1))]
-    return sequence[int(size*num):]
+    start, stop = task_slice(num, jobs, len(rows))
+    return [rows[i] for i in xrange(start, stop)]
 
 
 if __name__ == '__main__':
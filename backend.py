@@ -0,0 +1,140 @@
+import time
+import subprocess
+import threading
+
+from monitor import parse_qstat_xml, parse_qstat_times, run_qstat, parse_tasks, PENDING, DONE
+
+
+class GEBackend(object):
+    """Interface between GErunner and the scheduler.
+
+    `submit` takes a complete qsub command line and returns what `qsub -terse`
+    prints; `job` is the GEJob it was built from, when there is one.
+    """
+
+    def submit(self, commandline, job=None):
+        raise NotImplementedError
+
+    def status(self, job_ids=None):
+        """Return {(job_id, task): state} for the given (or all) jobs."""
+        raise NotImplementedError
+
+    def delete(self, job_ids):
+        raise NotImplementedError
+
+    def release(self, job_ids):
+        """Release the user holds (`qsub -h`) of the given jobs."""
+        raise NotImplementedError
+
+    def find(self, name, since):
+        """Return the IDs of queued or running jobs named `name` which were submitted at or after `since`."""
+        raise NotImplementedError
+
+
+class QsubBackend(GEBackend):
+    def submit(self, commandline, job=None):
+        process = subprocess.Popen(commandline, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, commandline, stderr or stdout)
+        return stdout
+
+    def status(self, job_ids=None):
+        states = parse_qstat_xml(run_qstat())
+        if job_ids is None:
+            return states
+        job_ids = set(job_ids)
+        return dict((key, state) for key, state in states.items() if key[0] in job_ids)
+
+    def delete(self, job_ids):
+        subprocess.check_call(["qdel", ','.join(map(str, job_ids))])
+
+    def release(self, job_ids):
+        subprocess.check_call(["qrls", ','.join(map(str, job_ids))])
+
+    def find(self, name, since):
+        since = int(since)  # qstat times have a resolution of one second
+        return sorted(job_id for job_id, (job_name, submitted) in parse_qstat_times(run_qstat()).items()
+                      if job_name == name and submitted >= since)
+
+
+def _option_value(commandline, option):
+    try:
+        return commandline[commandline.index(option) + 1]
+    except ValueError:
+        return None
+
+
+class FakeBackend(GEBackend):
+    """In-process stand-in for GridEngine.
+
+    Hands out sequential job IDs and records each submission's command line
+    and hold edges in `jobs`. Nothing is executed.
+    """
+
+    def __init__(self, first_id=1):
+        self.next_id = first_id
+        self.jobs = {}
+        self.order = []
+        self._lock = threading.Lock()
+
+    def submit(self, commandline, job=None):
+        hold_jid = _option_value(commandline, "-hold_jid")
+        hold_jid_ad = _option_value(commandline, "-hold_jid_ad")
+        array = _option_value(commandline, "-t")
+
+        with self._lock:
+            job_id = self.next_id
+            self.next_id += 1
+            self.order.append(job_id)
+            self.jobs[job_id] = dict(
+                commandline=list(commandline),
+                hold_jid=hold_jid.split(',') if hold_jid else [],
+                hold_jid_ad=hold_jid_ad.split(',') if hold_jid_ad else [],
+                array=array,
+                held="-h" in commandline,
+                state=PENDING,
+                submitted=time.time()
+            )
+
+        if array:
+            return "{}.{}{}\n".format(job_id, array, '' if ':' in array else ":1")
+        return "{}\n".format(job_id)
+
+    def finish(self, job_id, state=DONE):
+        self.jobs[job_id]["state"] = state
+
+    def status(self, job_ids=None):
+        states = {}
+        for job_id in self.order if job_ids is None else job_ids:
+            job = self.jobs.get(job_id)
+            if job is None or job["state"] is None:
+                continue
+            for task in parse_tasks(job["array"]) or [None]:
+                states[(job_id, task)] = job["state"]
+        return states
+
+    def delete(self, job_ids):
+        for job_id in job_ids:
+            self.jobs[job_id]["state"] = None
+
+    def release(self, job_ids):
+        for job_id in job_ids:
+            self.jobs[job_id]["held"] = False
+
+    def find(self, name, since):
+        return [job_id for job_id in self.order if self.jobs[job_id]["state"] is not None
+                and _option_value(self.jobs[job_id]["commandline"], "-N") == name
+                and self.jobs[job_id]["submitted"] >= since]
+
+
+_default_backend = QsubBackend()
+
+
+def get_backend():
+    return _default_backend
+
+
+def set_backend(backend):
+    global _default_backend
+    _default_backend = backend
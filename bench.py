@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob
+from backend import FakeBackend
+from qsubparse import script2pipeline
+
+
+class Timer(object):
+    def __init__(self, name, n):
+        self.name = name
+        self.n = n
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.time() - self.start
+        sys.stderr.write("{:<28}{:>8}{:>12.3f}s{:>12.1f}us/op\n".format(
+            self.name, self.n, elapsed, elapsed / self.n * 1e6
+        ))
+
+
+def make_jobs(n):
+    return [GEJob("ls", args=["-l", str(i)], binary=True, cwd=True, mem="4G", slot=2,
+                  stdout="/dev/null", stderr="/dev/null") for i in xrange(n)]
+
+
+def quiet_submit(pipeline, workers):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return pipeline.submit(workers=workers, backend=FakeBackend())
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Benchmark job construction, command building and submission")
+    parser.add_argument("-n", type=int, default=10000, help="Number of jobs per benchmark")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Submission workers")
+    args = parser.parse_args()
+    n = args.n
+
+    with Timer("GEJob construction", n):
+        jobs = make_jobs(n)
+
+    with Timer("_build_command", n):
+        for job in jobs:
+            job._build_command()
+
+    with Timer("_build_command (cached)", n):
+        for job in jobs:
+            job._build_command()
+
+    jobs = make_jobs(n)
+    with Timer("submit series", n):
+        quiet_submit(GESeriesJob(jobs), args.workers)
+
+    jobs = make_jobs(n)
+    with Timer("submit parallel", n):
+        quiet_submit(GEParallelJob(jobs), args.workers)
+
+    jobs = make_jobs(n)
+    with Timer("submit series/parallel", n):
+        quiet_submit(GESeriesJob([GEParallelJob(jobs[i:i+100]) for i in xrange(0, n, 100)]), args.workers)
+
+    lines = ["qsub -N step{} -hold_jid step{} -cwd -b y -l s_vmem=4G ls -l {}\n".format(i, i - 1, i)
+             for i in xrange(n)]
+    with Timer("import qsub script", n):
+        script2pipeline(lines)
+
+    table_dir = tempfile.mkdtemp()
+    try:
+        with Timer("submit array", n):
+            arrays = [GEArrayJob("echo", args=["{1}"], arg1=range(1000), table_dir=table_dir, binary=True)
+                      for _ in xrange(n // 1000 or 1)]
+            quiet_submit(GESeriesJob(arrays, as_array=True), args.workers)
+    finally:
+        shutil.rmtree(table_dir)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,265 @@
+import os
+from os import path
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+from monitor import get_monitor, parse_qacct, record2state, combine_states, DONE, FAILED
+from backend import get_backend
+
+CACHED = "CACHED"
+CHUNK = 1 << 20
+
+
+def file_digest(filename, _memo={}):
+    """sha256 of a file's content, remembered while its size and mtime are unchanged."""
+    st = os.stat(filename)
+    memo_key = (path.abspath(filename), st.st_size, st.st_mtime)
+    if memo_key not in _memo:
+        digest = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK), ''):
+                digest.update(chunk)
+        _memo[memo_key] = digest.hexdigest()
+    return _memo[memo_key]
+
+
+def place(src, dst, link=True):
+    """Hard link `src` to `dst` (copying across file systems), replacing `dst`."""
+    parent = path.dirname(path.abspath(dst))
+    if not path.isdir(parent):
+        os.makedirs(parent)
+    if path.lexists(dst):
+        os.remove(dst)
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+
+
+class GECache(object):
+    """Content-addressed store of the outputs of cacheable jobs.
+
+    A job marked `cacheable=True` is keyed by its command line without holds
+    and the digests of its `inputs`. On a hit its `outputs` are hard linked
+    (or, with `link=False` or across file systems, copied) from the store and
+    nothing is submitted. Submitted jobs are noted as pending in the store;
+    their outputs are copied into it once they have finished successfully,
+    as seen by the next `collect` (run before each submission with this
+    cache) or by a monitor which is still waiting. The store is kept under
+    `max_bytes` by evicting the least recently used entries.
+    """
+
+    MANIFEST = "manifest.json"
+    PENDING = ".pending"
+    LINKS = ".links"
+
+    def __init__(self, directory, max_bytes=None, link=True, backend=None, monitor=None):
+        self.directory = path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.link = link
+        self.backend = backend
+        self.monitor = monitor
+        self._lock = threading.Lock()
+        for directory in (self.directory, path.join(self.directory, self.PENDING),
+                          path.join(self.directory, self.LINKS)):
+            if not path.isdir(directory):
+                os.makedirs(directory)
+
+    @staticmethod
+    def _key(identity, inputs):
+        digest = hashlib.sha256('\0'.join(identity))
+        for filename in inputs or ():
+            try:
+                digest.update('\0{}\0{}'.format(filename, file_digest(filename)))
+            except (IOError, OSError):
+                return None
+        return digest.hexdigest()
+
+    def key(self, job):
+        """Cache key of `job`, or None if it is not cacheable or an input is missing."""
+        if not job.cacheable or not job.outputs:
+            return None
+        return self._key(job._identity(), job.inputs)
+
+    def _entry(self, key):
+        return path.join(self.directory, key[:2], key)
+
+    def _link_record(self, output):
+        return path.join(self.directory, self.LINKS, hashlib.sha1(path.abspath(output)).hexdigest())
+
+    def fetch(self, job):
+        """Materialise the cached outputs of `job`; return True on a hit."""
+        key = self.key(job)
+        if key is None:
+            return False
+        entry = self._entry(key)
+        if not path.isfile(path.join(entry, self.MANIFEST)):
+            return False
+
+        for i, output in enumerate(job.outputs):
+            place(path.join(entry, str(i)), output, self.link)
+            if self.link:
+                with open(self._link_record(output), 'w') as f:
+                    f.write(path.join(entry, str(i)))
+        os.utime(entry, None)
+        return True
+
+    def store(self, job):
+        """Copy the outputs of a finished `job` into the store."""
+        if self.key(job) is None:
+            return False
+        return self._store(job.name, job._identity(), job.inputs, job.outputs)
+
+    def _store(self, name, identity, inputs, outputs, expected=None):
+        """Store `outputs` under the key of `identity` and `inputs`, unless it is not `expected`."""
+        key = self._key(identity, inputs)
+        if key is None or (expected is not None and key != expected):
+            return False  # an input changed since the job was submitted
+        if not all(path.isfile(output) for output in outputs):
+            return False
+        entry = self._entry(key)
+        if path.isdir(entry):
+            return True
+
+        parent = path.dirname(entry)
+        if not path.isdir(parent):
+            os.makedirs(parent)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp.")
+        for i, output in enumerate(outputs):
+            place(output, path.join(tmp, str(i)), link=False)
+        with open(path.join(tmp, self.MANIFEST), 'w') as f:
+            json.dump(dict(name=name, outputs=outputs, identity=identity), f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp)  # stored concurrently by someone else
+
+        self.evict()
+        return True
+
+    def release(self, job):
+        """Remove outputs of `job` linked from the store, so that running it cannot rewrite an entry.
+
+        Only files which are still the inode `fetch` linked are removed.
+        """
+        for output in job.outputs or ():
+            record = self._link_record(output)
+            try:
+                with open(record) as f:
+                    linked = f.read()
+            except IOError:
+                continue
+            try:
+                if path.samefile(output, linked):
+                    os.remove(output)
+            except OSError:
+                pass  # the output or the entry is gone
+            os.remove(record)
+
+    def _pending_path(self, job):
+        digest = hashlib.sha1('\0'.join(job._identity())).hexdigest()
+        return path.join(self.directory, self.PENDING, "{}.{}.json".format(job.job_id, digest))
+
+    def submitted(self, job):
+        """Note a submitted cacheable `job`, so that its outputs are stored once it has succeeded."""
+        with open(self._pending_path(job), 'w') as f:
+            json.dump(dict(job_id=job.job_id, name=job.name, identity=job._identity(), inputs=job.inputs,
+                           outputs=job.outputs, key=self.key(job), submitted=time.time()), f)
+
+    def collect(self):
+        """Store the outputs of pending jobs which have succeeded since; return how many were stored.
+
+        The jobs are looked up with one status query, and with qacct once they
+        have left the queue. Jobs which failed, or whose inputs changed since
+        they were submitted, are forgotten; jobs still alive, or whose
+        accounting is not written yet, stay pending.
+        """
+        pending_dir = path.join(self.directory, self.PENDING)
+        pending = []
+        for name in os.listdir(pending_dir):
+            try:
+                with open(path.join(pending_dir, name)) as f:
+                    pending.append((path.join(pending_dir, name), json.load(f)))
+            except (IOError, ValueError):
+                continue
+        if not pending:
+            return 0
+
+        backend = get_backend() if self.backend is None else self.backend
+        monitor = get_monitor() if self.monitor is None else self.monitor
+        states = backend.status([record["job_id"] for _, record in pending])
+
+        stored = 0
+        for filename, record in pending:
+            current = [state for (job_id, _), state in states.items() if job_id == record["job_id"]]
+            if not current:
+                try:
+                    current = [record2state(r) for r in parse_qacct(monitor.qacct(record["job_id"]))]
+                except (subprocess.CalledProcessError, OSError):
+                    continue  # accounting is not written yet
+            state = combine_states(current)
+            if state == DONE:
+                fresh = all(path.isfile(output) and path.getmtime(output) >= record["submitted"]
+                            for output in record["outputs"])
+                if fresh and self._store(record["name"], record["identity"], record["inputs"], record["outputs"],
+                                         record.get("key")):
+                    stored += 1
+            elif state != FAILED:
+                continue
+            os.remove(filename)
+        return stored
+
+    def entries(self):
+        """List (last used, size, entry) of all stored entries."""
+        entries = []
+        for prefix in os.listdir(self.directory):
+            if prefix.startswith('.'):
+                continue
+            prefix = path.join(self.directory, prefix)
+            if not path.isdir(prefix):
+                continue
+            for name in os.listdir(prefix):
+                if name.startswith('.'):
+                    continue
+                entry = path.join(prefix, name)
+                size = sum(path.getsize(path.join(entry, f)) for f in os.listdir(entry))
+                entries.append((path.getmtime(entry), size, entry))
+        return entries
+
+    def evict(self):
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def store_when_done(self, job, monitor):
+        """Store the outputs of `job` once `monitor` sees it finish successfully.
+
+        This only happens while the process is alive; `submitted` and
+        `collect` cover drivers which exit after submitting.
+        """
+        key = self.key(job)
+
+        def callback(future):
+            if all(state == DONE for state in future.result().values()):
+                self._store(job.name, job._identity(), job.inputs, job.outputs, key)
+            if all(state in (DONE, FAILED) for state in future.result().values()):
+                try:
+                    os.remove(self._pending_path(job))
+                except OSError:
+                    pass
+        monitor.wait_async((job, [None])).add_done_callback(callback)
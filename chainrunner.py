@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+import argparse
+import os
+from os import path
+import json
+import socket
+import subprocess
+from string import Template
+
+
+def _main():
+    parser = argparse.ArgumentParser(description='Chain Runner. Run the steps of a fused job in order')
+    parser.add_argument("spec", help="Step list written by fusion.GEFusedJob")
+
+    options = parser.parse_args()
+    with open(options.spec) as f:
+        steps = json.load(f)
+
+    for step in steps:
+        exit_status = run_step(step)
+        if exit_status < 0:
+            exit_status = 128 - exit_status  # killed by a signal
+        if exit_status != 0:
+            exit(exit_status)
+
+
+def expand_path(spec, name, suffix, env=None, cwd=None):
+    """Resolve a qsub -o/-e path the way GridEngine does for a job called `name`.
+
+    `env` defaults to the current environment; relative paths are taken from `cwd` if given.
+    """
+    if not spec:
+        return None
+    spec = spec[0]
+    if ':' in spec and '/' not in spec.split(':', 1)[0]:
+        spec = spec.split(':', 1)[1]  # [hostname:]path
+
+    env = os.environ if env is None else env
+    job_id = env.get("JOB_ID", "0")
+    filename = Template(spec).safe_substitute(
+        HOME=env.get("HOME", ''), USER=env.get("USER", ''),
+        JOB_ID=job_id, JOB_NAME=name, HOSTNAME=socket.gethostname(), TASK_ID="undefined"
+    )
+    if cwd is not None:
+        filename = path.join(cwd, filename)
+    if path.isdir(filename):
+        filename = path.join(filename, "{}.{}{}".format(name, suffix, job_id))
+    return filename
+
+
+def run_step(step, cwd=None, env=None):
+    stdout_path = expand_path(step["stdout"], step["name"], 'o', env, cwd)
+    stderr_path = None if step["join"] else expand_path(step["stderr"], step["name"], 'e', env, cwd)
+
+    files = []
+    try:
+        stdout = stderr = None
+        if stdout_path:
+            stdout = open(stdout_path, 'a')
+            files.append(stdout)
+        if step["join"]:
+            stderr = subprocess.STDOUT
+        elif stderr_path:
+            stderr = open(stderr_path, 'a')
+            files.append(stderr)
+
+        if step["shell"]:
+            return subprocess.call(' '.join(step["argv"]), shell=True, stdout=stdout, stderr=stderr,
+                                   cwd=cwd, env=env)
+        return subprocess.call(step["argv"], stdout=stdout, stderr=stderr, cwd=cwd, env=env)
+    finally:
+        for f in files:
+            f.close()
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,153 @@
+import copy
+
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob, GEDAGJob, META_NAMES
+
+
+def coalesce_key(job):
+    """Key shared by jobs which differ only in their arguments, or None if `job` cannot be coalesced.
+
+    Only plain binary jobs running in the submission directory without a
+    shell (`-shell no`) qualify, since `arrayrunner.py` runs the command
+    directly from there: `$VAR`, globs and redirections in the arguments
+    would not be expanded. Jobs declaring `inputs`, `outputs` or
+    `cacheable` are left alone: the journal and the cache judge a job by
+    them, and an array would have only one set for all of its rows.
+    """
+    if type(job) is not GEJob or job.job_id is not None or job.next_job:
+        return None
+    if job.binary is not True or job.cwd is not True or job.array is not None or job.shell is not False:
+        return None
+    if any(job._opts.get(name) for name in META_NAMES):
+        return None
+
+    job._build_command()
+    nargs = len(job._opts.get("args", ()))
+    return (nargs, tuple(job.commandline[:len(job.commandline) - nargs]))
+
+
+def to_array(jobs, table_dir=None):
+    """Build one GEArrayJob running `jobs`, which must share a `coalesce_key`."""
+    opts = copy.deepcopy(jobs[0]._opts)
+    command = opts.pop("command")
+    opts.pop("args", None)
+    opts.pop("shell", None)
+
+    nargs = len(jobs[0].args)
+    axes = dict(("arg{}".format(i+1), [job.args[i] for job in jobs]) for i in xrange(nargs))
+    if not axes:
+        axes["arg1"] = [''] * len(jobs)
+
+    template = ["{{{}}}".format(i+1) for i in xrange(nargs)]
+    opts.update(axes)
+    return GEArrayJob(command, args=template, table_dir=table_dir, **opts)
+
+
+def group_by_key(jobs, keyfunc, min_group):
+    """Return {job: group} for groups of at least `min_group` jobs with the same key."""
+    groups = {}
+    for job in jobs:
+        key = keyfunc(job)
+        if key is not None:
+            groups.setdefault(key, []).append(job)
+
+    membership = {}
+    for group in groups.values():
+        if len(group) >= min_group:
+            for job in group:
+                membership[job] = group
+    return membership
+
+
+def _coalesce_branches(parallel, min_group, table_dir):
+    """Turn a parallel set of equally long series of homogeneous stages into a series of arrays."""
+    branches = parallel.jobs
+    if len(branches) < min_group or not all(type(b) is GESeriesJob and not b.as_array for b in branches):
+        return None
+    length = len(branches[0].jobs)
+    if any(len(b.jobs) != length for b in branches):
+        return None
+
+    stages = []
+    for i in xrange(length):
+        stage = [b.jobs[i] for b in branches]
+        keys = set(coalesce_key(job) for job in stage)
+        if len(keys) != 1 or None in keys:
+            return None
+        stages.append(stage)
+
+    return GESeriesJob([to_array(stage, table_dir) for stage in stages], as_array=True)
+
+
+def coalesce(pipeline, min_group=2, table_dir=None):
+    """Rewrite homogeneous independent jobs of `pipeline` as array jobs and return the new pipeline.
+
+    Within a GEParallelJob (or among GEDAGJob nodes with the same upstreams),
+    jobs which differ only in `args` become one GEArrayJob, so downstream
+    holds wait on a single array ID. A GEParallelJob of equally long
+    GESeriesJob chains whose stages are homogeneous across the chains
+    becomes a series of arrays linked with `-hold_jid_ad`.
+    """
+    if isinstance(pipeline, GESeriesJob):
+        pipeline.jobs = [coalesce(job, min_group, table_dir) for job in pipeline.jobs]
+        return pipeline
+
+    if isinstance(pipeline, GEParallelJob):
+        pipeline.jobs = [coalesce(job, min_group, table_dir) for job in pipeline.jobs]
+
+        series = _coalesce_branches(pipeline, min_group, table_dir)
+        if series is not None:
+            return series
+
+        membership = group_by_key(pipeline.jobs, coalesce_key, min_group)
+        jobs = []
+        arrays = {}
+        for job in pipeline.jobs:
+            if job not in membership:
+                jobs.append(job)
+                continue
+            group = id(membership[job])
+            if group not in arrays:
+                arrays[group] = to_array(membership[job], table_dir)
+                jobs.append(arrays[group])
+        pipeline.jobs = jobs
+        return pipeline
+
+    if isinstance(pipeline, GEDAGJob):
+        replaced = dict((job, coalesce(job, min_group, table_dir)) for job in pipeline.jobs)
+
+        def keyfunc(job):
+            key = coalesce_key(job)
+            if key is None:
+                return None
+            return key, tuple(sorted((id(upstream), as_array) for upstream, as_array in pipeline.deps[job]))
+
+        membership = group_by_key([job for job in pipeline.jobs if replaced[job] is job], keyfunc, min_group)
+        arrays = {}
+        for job in pipeline.jobs:
+            if job in membership:
+                group = id(membership[job])
+                if group not in arrays:
+                    arrays[group] = to_array(membership[job], table_dir)
+                replaced[job] = arrays[group]
+
+        dag = GEDAGJob()
+        for job in pipeline.jobs:
+            dag.add(replaced[job])
+
+        linked = set()
+        for job in pipeline.jobs:
+            new = replaced[job]
+            if new in linked:
+                continue  # the members of an array share their dependencies
+            linked.add(new)
+
+            after = []
+            after_array = []
+            for upstream, as_array in pipeline.deps[job]:
+                target = after_array if as_array else after
+                if replaced[upstream] not in target:
+                    target.append(replaced[upstream])
+            dag.add(new, after=after, after_array=after_array)
+        return dag
+
+    return pipeline
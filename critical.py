@@ -0,0 +1,75 @@
+import sys
+
+from submitter import JobGraph
+
+MIN_PRIORITY = -1023
+
+
+def get_runtime(estimates, job, default):
+    """Look up a runtime estimate (seconds per task) for `job`.
+
+    `estimates` is a callable taking the job, or a dict keyed by job or job name.
+    """
+    if estimates is None:
+        value = None
+    elif callable(estimates):
+        value = estimates(job)
+    elif job in estimates:
+        value = estimates[job]
+    else:
+        value = estimates.get(job.name)
+    return default if value is None else value
+
+
+def job_duration(job, runtime):
+    ntasks = getattr(job, "ntasks", None)
+    if ntasks and job.max_running:
+        return runtime * -(-ntasks // int(job.max_running))
+    return runtime
+
+
+def critical_path(graph, estimates, default=1.0):
+    """Return (makespan, {job: duration}, {job: slack}) for a flattened pipeline."""
+    duration = {}
+    finish = {}
+    for job in graph.order:
+        duration[job] = 0 if job in graph.joins else job_duration(job, get_runtime(estimates, job, default))
+        start = max([finish[upstream] for upstream, _ in graph.deps[job]] or [0])
+        finish[job] = start + duration[job]
+
+    makespan = max(finish.values() or [0])
+
+    latest = dict((job, makespan) for job in graph.order)
+    for job in reversed(graph.order):
+        for upstream, _ in graph.deps[job]:
+            latest[upstream] = min(latest[upstream], latest[job] - duration[job])
+
+    slack = dict((job, latest[job] - finish[job]) for job in graph.nodes)
+    return makespan, dict((job, duration[job]) for job in graph.nodes), slack
+
+
+def assign_priorities(pipeline, estimates=None, default=1.0, override=False, out=sys.stdout):
+    """Set -p and the array -tc of each job of `pipeline` from its critical-path slack.
+
+    Jobs on the critical path keep priority 0 and the others are lowered
+    in proportion to their slack. An array with slack gets a -tc which
+    still lets it finish in time. Values set by the user are kept unless `override`.
+    Prints the predicted makespan and returns (makespan, {job: slack}).
+    """
+    graph = JobGraph.from_pipeline(pipeline)
+    makespan, duration, slack = critical_path(graph, estimates, default)
+
+    for job in graph.nodes:
+        if override or job.priority is None:
+            job.priority = int(round(MIN_PRIORITY * slack[job] / float(makespan))) if makespan else 0
+
+        ntasks = getattr(job, "ntasks", None)
+        runtime = get_runtime(estimates, job, default)
+        if ntasks and runtime and slack[job] > 0 and (override or job.max_running is None):
+            waves = int((duration[job] + slack[job]) // runtime)
+            if waves > 1:
+                job.max_running = -(-ntasks // waves)
+
+    if out is not None:
+        out.write("Predicted makespan: {:.0f}s\n".format(makespan))
+    return makespan, slack
@@ -0,0 +1,97 @@
+import sys
+
+from piperunner import GEDAGJob, HOLD_NAMES
+from submitter import JobGraph
+from critical import get_runtime
+from simulator import job_slots, job_ntasks
+
+
+def duplicate_key(job):
+    """Key shared by jobs which run the same command with the same options and outputs, ignoring holds."""
+    return (type(job), tuple(job._identity()), tuple(job.outputs or ()))
+
+
+def _reaches(upstreams, target, starts):
+    """Whether `target` is one of `starts` or upstream of them in the merged graph."""
+    stack = list(starts)
+    seen = set()
+    while stack:
+        job = stack.pop()
+        if job is target:
+            return True
+        if job not in seen:
+            seen.add(job)
+            stack.extend(upstreams[job])
+    return False
+
+
+def merge_duplicates(pipeline, estimates=None, out=sys.stdout):
+    """Merge identical jobs of `pipeline` into one and return the new pipeline.
+
+    Jobs with the same `duplicate_key` become a single GEDAGJob node which
+    holds on the upstreams of all of them; their dependents hold on it
+    instead. A duplicate is kept if merging it would make a job wait for
+    itself. Prints the number of submissions saved and, with runtime
+    `estimates` (as for `critical.assign_priorities`), the slot-seconds of
+    compute saved. The pipeline is returned unchanged if nothing is merged.
+    """
+    graph = JobGraph()
+    pipeline._flatten(graph)
+
+    sources = {}  # job -> the job it is merged into
+    upstreams = {}  # merged job -> its merged upstreams
+    candidates = {}
+    merged = []
+    for job in graph.order:
+        starts = set(sources[upstream] for upstream, _ in graph.deps[job])
+        if job in graph.joins:
+            sources[job] = job
+            upstreams[job] = starts
+            continue
+        key = duplicate_key(job)
+        for canonical in candidates.get(key, ()):
+            if not _reaches(upstreams, canonical, starts):
+                sources[job] = canonical
+                upstreams[canonical] |= starts
+                merged.append(job)
+                break
+        else:
+            sources[job] = job
+            upstreams[job] = starts
+            candidates.setdefault(key, []).append(job)
+
+    if out is not None:
+        tasks = sum(job_ntasks(job) for job in merged)
+        runtimes = [get_runtime(estimates, job, None) for job in merged]
+        line = "{} duplicate jobs merged: {} fewer submissions, {} fewer tasks".format(len(merged), len(merged), tasks)
+        if merged and None not in runtimes:
+            line += ", {:.0f} slot-seconds of compute saved".format(
+                sum(runtime * job_ntasks(job) * job_slots(job) for job, runtime in zip(merged, runtimes))
+            )
+        out.write(line + '\n')
+
+    if not merged:
+        return pipeline
+
+    after = dict((job, []) for job in graph.nodes if sources[job] is job)
+    after_array = dict((job, []) for job in after)
+    linked = dict((job, set()) for job in after)
+    for job in graph.nodes:
+        target = sources[job]
+        for upstream, as_array in graph.expand(job):
+            upstream = sources[upstream]
+            if (upstream, as_array) not in linked[target]:
+                linked[target].add((upstream, as_array))
+                (after_array if as_array else after)[target].append(upstream)
+        if target is not job:
+            for name in HOLD_NAMES:
+                for jid in job._opts.get(name, ()):
+                    if jid not in target._opts.get(name, ()):
+                        target._opts.setdefault(name, []).append(jid)
+
+    dag = GEDAGJob()
+    for job in graph.nodes:
+        if sources[job] is job:
+            job.next_job = ()  # its dependents are linked in the DAG
+            dag.add(job, after=after[job], after_array=after_array[job])
+    return dag
@@ -0,0 +1,146 @@
+import json
+import time
+import threading
+
+# phases of a submission; each event is a dict with "event" and "time" plus the fields below
+CONSTRUCT = "construct"  # name, duration
+BUILD = "build"  # name, duration, argc, cached
+FLATTEN = "flatten"  # nodes, barriers, duration
+HOLDS = "holds"  # name, holds, duration
+QSUB = "qsub"  # name, job_id, argc, duration
+REPORT = "report"  # name, job_id, status, line
+RUN = "run"  # nodes, submitted, workers, duration
+
+_sinks = []
+_wanted = {}
+
+
+def _update():
+    wanted = {}
+    for sink in _sinks:
+        for event in sink.events or (CONSTRUCT, BUILD, FLATTEN, HOLDS, QSUB, REPORT, RUN):
+            wanted.setdefault(event, []).append(sink)
+    global _wanted
+    _wanted = wanted
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+    _update()
+    return sink
+
+
+def remove_sink(sink):
+    _sinks.remove(sink)
+    _update()
+
+
+def get_sinks():
+    return list(_sinks)
+
+
+def enabled(event):
+    """True if any sink listens to `event`; callers skip timing otherwise."""
+    return event in _wanted
+
+
+def emit(event, **fields):
+    sinks = _wanted.get(event)
+    if not sinks:
+        return
+    fields["event"] = event
+    fields.setdefault("time", time.time())
+    for sink in sinks:
+        sink(fields)
+
+
+class Sink(object):
+    """Receives event dicts. `events` limits which events are delivered (None for all)."""
+
+    events = None
+
+    def __call__(self, event):
+        raise NotImplementedError
+
+
+class ConsoleSink(Sink):
+    """Print the `name -> id [ STATUS ]` line of each job."""
+
+    events = (REPORT,)
+
+    def __call__(self, event):
+        print event["line"]
+
+
+class JSONLinesSink(Sink):
+    """Append every event as one JSON line to `out`, a path or a file object."""
+
+    def __init__(self, out, events=None):
+        self.out = open(out, 'a') if isinstance(out, basestring) else out
+        self.events = events
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, sort_keys=True) + '\n'
+        with self._lock:
+            self.out.write(line)
+            self.out.flush()
+
+    def close(self):
+        self.out.close()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100.0 * len(sorted_values)))]
+
+
+class SummarySink(Sink):
+    """Collect phase durations and summarise them at the end of each run.
+
+    With `out`, the summary is written there whenever a submission finishes.
+    """
+
+    events = (CONSTRUCT, BUILD, FLATTEN, HOLDS, QSUB, RUN)
+
+    def __init__(self, out=None):
+        self.out = out
+        self.durations = {}
+        self.runs = []
+
+    def __call__(self, event):
+        if event["event"] == RUN:
+            self.runs.append(event)
+            if self.out is not None:
+                self.out.write(self.report() + '\n')
+        else:
+            self.durations.setdefault(event["event"], []).append(event["duration"])
+
+    def summary(self):
+        """Return {phase: {count, total, p50, p99}} and, after a run, "throughput" in qsub calls per second."""
+        summary = {}
+        for phase, durations in self.durations.items():
+            durations = sorted(durations)
+            summary[phase] = dict(count=len(durations), total=sum(durations),
+                                  p50=percentile(durations, 50), p99=percentile(durations, 99))
+        elapsed = sum(run["duration"] for run in self.runs)
+        if elapsed:
+            summary["throughput"] = sum(run["submitted"] for run in self.runs) / elapsed
+        return summary
+
+    def report(self):
+        summary = self.summary()
+        lines = []
+        for phase in (CONSTRUCT, BUILD, FLATTEN, HOLDS, QSUB):
+            if phase in summary:
+                s = summary[phase]
+                lines.append("{:<10}{:>8} calls {:>10.3f}s total  p50 {:.1f}ms  p99 {:.1f}ms".format(
+                    phase, s["count"], s["total"], s["p50"] * 1e3, s["p99"] * 1e3
+                ))
+        if "throughput" in summary:
+            lines.append("{:.1f} submissions/s".format(summary["throughput"]))
+        return '\n'.join(lines)
+
+
+console = add_sink(ConsoleSink())
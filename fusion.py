@@ -0,0 +1,178 @@
+import os
+from os import path
+import json
+import hashlib
+import tempfile
+
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob, GEDAGJob
+
+# options which may differ between the steps of a fused job
+STEP_OPTIONS = frozenset(["command", "args", "name", "stdout", "stderr", "join", "shell",
+                          "hold_jid", "inputs", "outputs", "cacheable", "verbose"])
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def fusion_key(job):
+    """Key shared by jobs which can run one after another in one job, or None if `job` cannot be fused.
+
+    Only plain binary jobs qualify; their resources, queue, working
+    directory and other scheduling options must be the same. Empty lists
+    and dicts are left out, as reading an option such as `job.resource`
+    stores one.
+    """
+    if type(job) is not GEJob or job.job_id is not None or job.next_job:
+        return None
+    if job.binary is not True or job.array is not None or job._opts.get("hold_jid_ad"):
+        return None
+    return tuple(sorted((name, _freeze(value)) for name, value in job._opts.items()
+                        if name not in STEP_OPTIONS and not (value == [] or value == {})))
+
+
+class GEFusedJob(GEJob):
+    """One job running the steps of a chain in order with `chainrunner.py`.
+
+    It stops at the first step which fails and exits with its status.
+    Each step's `stdout`, `stderr` and `join` are applied by the runner.
+    """
+
+    __slots__ = ("spec", "step_commands")
+
+    CHAINRUNNER = path.join(path.dirname(path.abspath(__file__)), "chainrunner.py")
+
+    def __init__(self, jobs, spec_dir=None):
+        steps = [dict(name=job.name, argv=map(str, [job.command] + list(job.args or ())),
+                      shell=job.shell is not False, stdout=job.stdout, stderr=job.stderr,
+                      join=bool(job.join)) for job in jobs]
+
+        spec_dir = GEArrayJob.TABLE_DIR if spec_dir is None else spec_dir
+        if not path.isdir(spec_dir):
+            os.makedirs(spec_dir)
+        fd, spec = tempfile.mkstemp(suffix=".chain", prefix="{}.".format(jobs[0].name), dir=spec_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(steps, f)
+
+        holds = []
+        for job in jobs:
+            for jid in job.hold_jid:
+                if jid not in holds:
+                    holds.append(jid)
+
+        opts = dict((name, value) for name, value in jobs[0]._opts.items() if name not in STEP_OPTIONS)
+        super(GEFusedJob, self).__init__(
+            GEArrayJob.INTERPRETER, args=[self.CHAINRUNNER, path.abspath(spec)],
+            name='+'.join(job.name for job in jobs), hold_jid=holds,
+            stdout="/dev/null" if all(step["stdout"] for step in steps) else None,
+            stderr="/dev/null" if all(step["stderr"] or step["join"] for step in steps) else None,
+            **opts
+        )
+        self.spec = path.abspath(spec)
+        self.step_commands = [job.command for job in jobs]
+
+    def _commands(self):
+        return self.step_commands
+
+    def _identity(self):
+        with open(self.spec, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        return [digest if arg == self.spec else arg for arg in super(GEFusedJob, self)._identity()]
+
+
+def _fuse_series(jobs, min_chain, spec_dir):
+    fused = []
+    run = []
+    run_key = None
+
+    def flush():
+        if len(run) >= min_chain:
+            fused.append(GEFusedJob(run, spec_dir))
+        else:
+            fused.extend(run)
+        del run[:]
+
+    for job in jobs:
+        key = fusion_key(job)
+        if key is None or key != run_key:
+            flush()
+            run_key = key
+        if key is None:
+            fused.append(job)
+        else:
+            run.append(job)
+    flush()
+    return fused
+
+
+def _dag_chains(dag, min_chain):
+    keys = dict((job, fusion_key(job)) for job in dag.jobs)
+    dependents = dict((job, []) for job in dag.jobs)
+    for job in dag.jobs:
+        for upstream, as_array in dag.deps[job]:
+            dependents[upstream].append((job, as_array))
+
+    def linked(upstream, job):
+        return (keys[job] is not None and keys[job] == keys[upstream] and
+                dependents[upstream] == [(job, False)] and dag.deps[job] == [(upstream, False)])
+
+    chains = []
+    for job in dag.jobs:
+        if keys[job] is None:
+            continue
+        deps = dag.deps[job]
+        if len(deps) == 1 and linked(deps[0][0], job):
+            continue  # not the head of a chain
+
+        chain = [job]
+        while len(dependents[chain[-1]]) == 1 and linked(chain[-1], dependents[chain[-1]][0][0]):
+            chain.append(dependents[chain[-1]][0][0])
+        if len(chain) >= min_chain:
+            chains.append(chain)
+    return chains
+
+
+def fuse(pipeline, min_chain=2, spec_dir=None):
+    """Rewrite chains of compatible jobs in `pipeline` as GEFusedJobs and return the new pipeline.
+
+    Consecutive jobs of a GESeriesJob (and GEDAGJob chains in which each job
+    is the only dependent of the previous one) which share a `fusion_key`
+    become one job, saving a scheduling round trip per step. Holds on or by
+    the chain from outside are moved to the fused job.
+    """
+    if isinstance(pipeline, GESeriesJob):
+        pipeline.jobs = [fuse(job, min_chain, spec_dir) for job in pipeline.jobs]
+        if not pipeline.as_array:
+            pipeline.jobs = _fuse_series(pipeline.jobs, min_chain, spec_dir)
+        return pipeline
+
+    if isinstance(pipeline, GEParallelJob):
+        pipeline.jobs = [fuse(job, min_chain, spec_dir) for job in pipeline.jobs]
+        return pipeline
+
+    if isinstance(pipeline, GEDAGJob):
+        replaced = dict((job, fuse(job, min_chain, spec_dir)) for job in pipeline.jobs)
+        for chain in _dag_chains(pipeline, min_chain):
+            fused = GEFusedJob(chain, spec_dir)
+            for job in chain:
+                replaced[job] = fused
+
+        dag = GEDAGJob()
+        for job in pipeline.jobs:
+            dag.add(replaced[job])
+        for job in pipeline.jobs:
+            new = replaced[job]
+            after = []
+            after_array = []
+            for upstream, as_array in pipeline.deps[job]:
+                target = after_array if as_array else after
+                if replaced[upstream] is not new and replaced[upstream] not in target:
+                    target.append(replaced[upstream])
+            dag.add(new, after=after, after_array=after_array)
+        return dag
+
+    return pipeline
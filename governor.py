@@ -0,0 +1,235 @@
+import time
+import threading
+import subprocess
+import xml.etree.ElementTree as ET
+
+from backend import GEBackend, get_backend, _option_value
+from monitor import count_tasks, PENDING, RUNNING, ERROR
+
+# qsub errors which show the request never reached qmaster, so it can be sent again
+UNSENT_ERRORS = ("unable to contact qmaster", "unable to send message to qmaster", "commlib error")
+
+# seconds the clocks of this host and qmaster may differ by
+CLOCK_SKEW = 60
+
+
+class GEGovernor(GEBackend):
+    """Backend wrapper which keeps the number of our queued tasks under site limits.
+
+    Before each `qsub` it waits until the tasks of the new job fit under
+    `max_pending` (pending, held or in error) and `max_active` (pending or
+    running). Tasks of the jobs submitted through it are counted with one
+    batched status query per `interval`. An array with more tasks than a
+    limit is submitted with `-tc` set to that limit and counts as that many
+    tasks.
+
+    A failed `qsub` is retried up to `retries` times with exponential
+    backoff. Unless qsub failed before reaching qmaster, the queue is first
+    searched for a job of the same name submitted since the attempt (give
+    or take CLOCK_SKEW) and not already known, which is taken as the result
+    instead of submitting the job twice. As a name is all qmaster can be asked
+    about, no job is taken while another submission of that name is in
+    flight, or once one ended without telling whether qmaster accepted it;
+    the failure is raised instead.
+    """
+
+    def __init__(self, backend=None, max_pending=None, max_active=None, interval=30,
+                 retries=5, backoff=2.0, max_backoff=300, sleep=time.sleep, clock=time.time):
+        self.backend = backend
+        self.max_pending = max_pending
+        self.max_active = max_active
+        self.interval = interval
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.clock = clock
+
+        self.tracked = set()
+        self.limits = {}  # job ID -> -tc of throttled arrays
+        self.pending = 0
+        self.running = 0
+        self.inflight = 0  # tasks admitted whose qsub has not returned yet
+        self.last_refresh = None
+        self._fresh = {}  # job ID -> tasks of jobs submitted since the last status query started
+        self._names = {}  # -N name -> submissions of that name whose qsub has not returned yet
+        self._doubtful = set()  # names of jobs qsub may have submitted without their ID being known
+        self._lock = threading.Lock()
+
+    @property
+    def inner(self):
+        return get_backend() if self.backend is None else self.backend
+
+    def _fits(self, ntasks):
+        pending = self.pending + self.inflight + sum(self._fresh.values())
+        if self.max_pending is not None and pending + ntasks > self.max_pending:
+            return False
+        if self.max_active is not None and pending + self.running + ntasks > self.max_active:
+            return False
+        return True
+
+    def _throttle(self, commandline):
+        """Return the command line and its number of tasks, with `-tc` set if the array exceeds a limit."""
+        ntasks = count_tasks(_option_value(commandline, "-t")) or 1
+        limits = [limit for limit in (self.max_pending, self.max_active) if limit is not None]
+        if not limits or ntasks <= min(limits):
+            return commandline, ntasks, None
+
+        limit = max(1, min(limits))
+        commandline = list(commandline)
+        if "-tc" in commandline:
+            i = commandline.index("-tc")
+            limit = min(limit, int(commandline[i+1]))
+            commandline[i+1] = str(limit)
+        else:
+            commandline[1:1] = ["-tc", str(limit)]
+        return commandline, limit, limit
+
+    def refresh(self):
+        """Count our pending and running tasks with one status query."""
+        with self._lock:
+            self.last_refresh = self.clock()
+            queried = set(self._fresh)
+            job_ids = list(self.tracked | queried)
+        try:
+            states = self.inner.status(job_ids)
+        except (subprocess.CalledProcessError, OSError, ET.ParseError):
+            return  # qmaster is busy or unreachable; keep the last counts
+
+        counts = {}
+        for (job_id, _), state in states.items():
+            if state in (PENDING, ERROR):
+                counts.setdefault(job_id, [0, 0])[0] += 1
+            elif state == RUNNING:
+                counts.setdefault(job_id, [0, 0])[1] += 1
+
+        pending = running = 0
+        with self._lock:
+            for job_id, (job_pending, job_running) in counts.items():
+                limit = self.limits.get(job_id)
+                if limit is not None:
+                    job_running = min(job_running, limit)
+                    job_pending = min(job_pending, limit - job_running)
+                pending += job_pending
+                running += job_running
+            for job_id in queried:
+                del self._fresh[job_id]
+            self.tracked = set(counts)
+            self.limits = dict((job_id, limit) for job_id, limit in self.limits.items()
+                               if job_id in self.tracked or job_id in self._fresh)
+            self.pending, self.running = pending, running
+
+    def _admit(self, ntasks):
+        while True:
+            with self._lock:
+                if self._fits(ntasks):
+                    self.inflight += ntasks
+                    return
+                waited = None if self.last_refresh is None else self.clock() - self.last_refresh
+            if waited is None or waited >= self.interval:
+                self.refresh()
+            else:
+                self.sleep(self.interval - waited)
+
+    def _submitted(self, stdout, ntasks, limit):
+        job_id = int(stdout.strip().split('.')[0])
+        with self._lock:
+            self.inflight -= ntasks
+            self._fresh[job_id] = ntasks
+            if limit is not None:
+                self.limits[job_id] = limit
+
+    def _release(self, ntasks):
+        with self._lock:
+            self.inflight -= ntasks
+
+    def _enter(self, name):
+        with self._lock:
+            self._names[name] = self._names.get(name, 0) + 1
+
+    def _leave(self, name):
+        with self._lock:
+            self._names[name] -= 1
+            if not self._names[name]:
+                del self._names[name]
+
+    def _find_submitted(self, commandline, since):
+        """Return what qsub would have printed for a job qmaster accepted after `since`, or None if there is none."""
+        name = _option_value(commandline, "-N")
+        if name is None:
+            raise IOError("cannot tell whether qsub submitted the job as it has no name")
+        with self._lock:
+            if self._names.get(name, 0) > 1 or name in self._doubtful:
+                raise IOError("cannot tell {} from other submissions of the same name".format(name))
+        found = self.inner.find(name, since - CLOCK_SKEW)
+        with self._lock:
+            found = [job_id for job_id in found if job_id not in self.tracked and job_id not in self._fresh]
+        if len(found) > 1:
+            raise IOError("qsub may have submitted {} more than once: {}".format(name, ','.join(map(str, found))))
+        if not found:
+            return None
+        array = _option_value(commandline, "-t")
+        if array:
+            return "{}.{}{}\n".format(found[0], array, '' if ':' in array else ":1")
+        return "{}\n".format(found[0])
+
+    def submit(self, commandline, job=None):
+        commandline, ntasks, limit = self._throttle(commandline)
+        self._admit(ntasks)
+        name = _option_value(commandline, "-N")
+        self._enter(name)
+        try:
+            stdout = self._submit(commandline, job, ntasks, name)
+        finally:
+            self._leave(name)
+        self._submitted(stdout, ntasks, limit)
+        return stdout
+
+    def _submit(self, commandline, job, ntasks, name):
+        stdout = None
+        for attempt in xrange(self.retries + 1):
+            since = self.clock()
+            try:
+                stdout = self.inner.submit(commandline, job)
+                break
+            except (subprocess.CalledProcessError, OSError) as e:
+                error = getattr(e, "output", None) or str(e)
+                unsent = isinstance(e, OSError) or any(message in error for message in UNSENT_ERRORS)
+                if attempt == self.retries and unsent:
+                    self._release(ntasks)
+                    raise IOError("qsub failed {} times, last with: {}".format(attempt + 1, error))
+                self.sleep(min(self.max_backoff, self.backoff * 2 ** attempt))
+                if unsent:
+                    continue
+                try:
+                    stdout = self._find_submitted(commandline, since)
+                except (subprocess.CalledProcessError, OSError, ET.ParseError, NotImplementedError, IOError) as find_error:
+                    self._release(ntasks)
+                    self._doubt(name)
+                    raise IOError("qsub failed with: {}; not retried as the job may have been submitted ({})".format(
+                        error, str(find_error) or type(find_error).__name__
+                    ))
+                if stdout is not None:
+                    break
+                if attempt == self.retries:
+                    self._release(ntasks)
+                    self._doubt(name)
+                    raise IOError("qsub failed {} times, last with: {}".format(attempt + 1, error))
+        return stdout
+
+    def _doubt(self, name):
+        if name is not None:
+            with self._lock:
+                self._doubtful.add(name)
+
+    def status(self, job_ids=None):
+        return self.inner.status(job_ids)
+
+    def delete(self, job_ids):
+        return self.inner.delete(job_ids)
+
+    def release(self, job_ids):
+        return self.inner.release(job_ids)
+
+    def find(self, name, since):
+        return self.inner.find(name, since)
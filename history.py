@@ -0,0 +1,163 @@
+import re
+import sys
+import json
+import math
+import threading
+import subprocess
+from os import path
+
+from monitor import run_qacct, parse_qacct, record2state, DONE, _LeafCollector
+from simulator import parse_mem, job_slots
+import events
+
+MB = 1024 ** 2
+# CPU time per wall clock second above a whole number which does not ask for another slot
+SLOT_TOLERANCE = 0.1
+
+
+def parse_seconds(value):
+    """Read the leading number of a qacct field such as "12.345s" or "12"."""
+    m = re.match(r"^\s*([\d.]+)", value or '')
+    return float(m.group(1)) if m else 0.0
+
+
+def record2sample(record):
+    """Keep the fields of a qacct record used for right-sizing."""
+    task = record.get("taskid", "undefined")
+    return dict(
+        job_id=int(record["jobnumber"]) if record.get("jobnumber", '').isdigit() else None,
+        task=None if task == "undefined" else int(task),
+        ok=record2state(record) == DONE,
+        maxvmem=parse_mem(record.get("maxvmem", '0')),
+        wallclock=parse_seconds(record.get("ru_wallclock")),
+        cpu=parse_seconds(record.get("cpu")),
+        slots=int(parse_seconds(record.get("slots", '1'))) or 1
+    )
+
+
+class GEHistory(object):
+    """Local store of qacct accounting of finished jobs, keyed by job name or command.
+
+    Each line holds the peak memory, wall clock and CPU time, slots and exit
+    state of one job or task. `suggest` turns the successful records of a key
+    into memory, slot and runtime requests for new jobs of the same kind.
+    """
+
+    def __init__(self, history_path, by="name", qacct=run_qacct):
+        if by not in ("name", "command"):
+            raise ValueError("History key must be 'name' or 'command': {}".format(by))
+        self.path = history_path
+        self.by = by
+        self.qacct = qacct
+        self.samples = {}
+        self._seen = set()
+        self._lock = threading.Lock()
+
+        if path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        sample = json.loads(line)
+                        self._remember(sample.pop("key"), sample)
+
+    def key(self, job):
+        return job.name if self.by == "name" else job._commands()[0]
+
+    def _remember(self, key, sample):
+        self.samples.setdefault(key, []).append(sample)
+        if sample["job_id"] is not None:
+            self._seen.add((sample["job_id"], sample["task"]))
+
+    def record_text(self, key, text):
+        """Store the records of `qacct -j` output `text` under `key`; return how many were new."""
+        added = 0
+        for record in parse_qacct(text):
+            sample = record2sample(record)
+            if sample["job_id"] is not None and (sample["job_id"], sample["task"]) in self._seen:
+                continue
+            with self._lock:
+                self._remember(key, sample)
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(dict(sample, key=key)) + '\n')
+            added += 1
+        return added
+
+    def collect(self, target):
+        """Look up the accounting of every submitted job of `target` (a job or a pipeline)."""
+        collector = _LeafCollector()
+        target._flatten(collector)
+        added = 0
+        for job in collector.nodes:
+            if job.job_id is None:
+                continue
+            try:
+                text = self.qacct(job.job_id)
+            except subprocess.CalledProcessError:
+                continue  # not finished or accounting not written yet
+            added += self.record_text(self.key(job), text)
+        return added
+
+    def suggest(self, job, percentile=95, headroom=1.2, min_samples=1):
+        """Return dict(mem, total_mem, slot, runtime, samples) for `job`, or None with too few successful records.
+
+        `mem` is per suggested slot as for `GEJob(mem=...)` and `total_mem`
+        for the whole job, both in bytes; `runtime` is in seconds.
+        """
+        samples = [s for s in self.samples.get(self.key(job), ()) if s["ok"]]
+        if len(samples) < max(1, min_samples):
+            return None
+
+        def pct(values):
+            return events.percentile(sorted(values), percentile)
+
+        cores = pct([s["cpu"] / s["wallclock"] if s["wallclock"] else 1 for s in samples])
+        slot = max(1, int(math.ceil(cores - SLOT_TOLERANCE)))
+        total_mem = int(math.ceil(pct([s["maxvmem"] for s in samples]) * headroom))
+        runtime = pct([s["wallclock"] for s in samples]) * headroom
+        return dict(mem=-(-total_mem // slot), total_mem=total_mem, slot=slot,
+                    runtime=int(math.ceil(runtime)), samples=len(samples))
+
+    def estimate(self, job, percentile=50):
+        """Typical runtime of `job` in seconds, usable as `estimates` of `critical.assign_priorities`."""
+        suggestion = self.suggest(job, percentile, headroom=1.0)
+        return None if suggestion is None else suggestion["runtime"]
+
+
+def right_size(pipeline, history, percentile=95, headroom=1.2, min_samples=1,
+               apply=False, override=False, out=sys.stdout):
+    """Suggest (or with `apply`, set) mem, slot and h_rt of the jobs of `pipeline` from `history`.
+
+    Memory is the `percentile` of the peak memory of successful runs times
+    `headroom`; runtime likewise. Slots follow the CPU time per wall clock
+    second. Requests set by the user are kept unless `override`; memory is
+    divided among the slots the job will run with.
+    Prints one line per job with history and returns {job: suggestion}.
+    """
+    collector = _LeafCollector()
+    pipeline._flatten(collector)
+
+    suggestions = {}
+    for job in collector.nodes:
+        suggestion = history.suggest(job, percentile, headroom, min_samples)
+        if suggestion is None:
+            continue
+        suggestions[job] = suggestion
+        keep_slots = job.parallel_env and not override
+        slot = job_slots(job) if keep_slots else suggestion["slot"]
+        mem = "{}M".format(-(-suggestion["total_mem"] // (slot * MB)))
+
+        if apply:
+            resource = job.resource
+            if override or "s_vmem" not in resource:
+                resource["s_vmem"] = mem
+                resource["mem_req"] = mem
+            if override or "h_rt" not in resource:
+                resource["h_rt"] = str(suggestion["runtime"])
+            if not keep_slots:
+                job.parallel_env = dict(def_slot=[slot]) if slot > 1 else {}
+
+        if out is not None:
+            out.write("{}\tmem={} slot={} h_rt={} ({} runs)\n".format(
+                job.name, mem, slot, suggestion["runtime"], suggestion["samples"]
+            ))
+    return suggestions
@@ -0,0 +1,134 @@
+from os import path
+import json
+import hashlib
+import threading
+import subprocess
+
+from monitor import get_monitor, parse_qacct, record2state, combine_states, PENDING, RUNNING, DONE, UNKNOWN, FINISHED
+from backend import get_backend
+
+SUBMITTED = "submitted"
+# not known to have finished; UNKNOWN is a job gone from qstat whose accounting is not readable yet
+ALIVE = (SUBMITTED, PENDING, RUNNING, UNKNOWN)
+
+REUSE = "REUSED"
+SKIP = "SKIPPED"
+
+
+def outputs_fresh(job):
+    """True if `job` declares outputs which all exist and are newer than all of its inputs."""
+    if not job.outputs:
+        return False
+    try:
+        oldest_output = min(path.getmtime(output) for output in job.outputs)
+    except OSError:
+        return False
+    try:
+        newest_input = max([path.getmtime(i) for i in job.inputs or ()] or [0])
+    except OSError:
+        return False
+    return oldest_output >= newest_input
+
+
+class GEJournal(object):
+    """Append-only record of submitted jobs for make-style re-submission.
+
+    Each line holds a job's identity (a digest of its command line without
+    holds), the job ID it was given and its last known state. On the next
+    submission of the same pipeline, jobs which are still pending or running
+    are reused, finished ones are skipped, and only the rest is submitted.
+    """
+
+    def __init__(self, journal_path, backend=None, monitor=None):
+        self.path = journal_path
+        self.backend = backend
+        self.monitor = monitor
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        if path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def keys(self, jobs):
+        """Identity of each job; repeated identical jobs are told apart by occurrence."""
+        seen = {}
+        keys = {}
+        for job in jobs:
+            digest = hashlib.sha1('\0'.join(job._identity())).hexdigest()
+            seen[digest] = seen.get(digest, 0) + 1
+            keys[job] = "{}#{}".format(digest, seen[digest])
+        return keys
+
+    def record(self, key, job, state, job_id=None, array=None):
+        if job_id is None:
+            job_id, array = job.job_id, job.array
+        entry = dict(key=key, name=job.name, job_id=job_id, array=array, state=state)
+        with self._lock:
+            self.entries[key] = entry
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def refresh(self, keys):
+        """Update the recorded state of unfinished entries with one status query.
+
+        Jobs which have left the queue get their final state from qacct; while
+        their accounting cannot be read they stay UNKNOWN and are checked again
+        on the next run.
+        """
+        entries = [(key, job) for job, key in keys.items()
+                   if key in self.entries and self.entries[key]["state"] not in FINISHED]
+        if not entries:
+            return
+
+        backend = get_backend() if self.backend is None else self.backend
+        monitor = get_monitor() if self.monitor is None else self.monitor
+        states = backend.status([self.entries[key]["job_id"] for key, _ in entries])
+
+        for key, job in entries:
+            entry = self.entries[key]
+            current = [state for (job_id, _), state in states.items() if job_id == entry["job_id"]]
+            if not current:
+                try:
+                    records = parse_qacct(monitor.qacct(entry["job_id"]))
+                except (subprocess.CalledProcessError, OSError):
+                    records = []  # accounting is not written yet or qacct is unavailable
+                current = [record2state(record) for record in records] or [UNKNOWN]
+            state = combine_states(current)
+            if state != entry["state"]:
+                self.record(key, job, state, entry["job_id"], entry["array"])
+
+    def plan(self, graph, barriers=()):
+        """Decide which jobs of `graph` need no submission.
+
+        Returns {job: (REUSE or SKIP, job_id, array)}. A job is only reused or
+        skipped when none of its upstream jobs is going to be submitted.
+        """
+        jobs = [job for job in graph.nodes if job not in barriers]
+        keys = self.keys(jobs)
+        self.refresh(keys)
+
+        decisions = {}
+        for job in graph.nodes:
+            graph.decide_joins(job, decisions)
+            upstreams = [upstream for upstream, _ in graph.deps[job]]
+            if any(upstream not in decisions for upstream in upstreams):
+                continue
+
+            if job in barriers:
+                if all(decisions[upstream][0] == SKIP for upstream in upstreams):
+                    decisions[job] = (SKIP, None, None)
+                continue
+
+            entry = self.entries.get(keys[job])
+            if entry is not None and entry["state"] in ALIVE:
+                decisions[job] = (REUSE, entry["job_id"], entry["array"])
+            elif outputs_fresh(job):
+                decisions[job] = (SKIP, None, None)
+            elif entry is not None and entry["state"] == DONE and not job.outputs:
+                decisions[job] = (SKIP, entry["job_id"], entry["array"])
+
+        return decisions, keys
@@ -0,0 +1,338 @@
+import re
+import collections
+import subprocess
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+PENDING = "pending"
+RUNNING = "running"
+ERROR = "error"
+DONE = "done"
+FAILED = "failed"
+UNKNOWN = "unknown"
+
+FINISHED = (DONE, FAILED)
+
+
+def run_qstat():
+    return subprocess.check_output(["qstat", "-xml"])
+
+
+def run_qacct(job_id):
+    return subprocess.check_output(["qacct", "-j", str(job_id)], stderr=subprocess.STDOUT)
+
+
+def _task_ranges(tasks):
+    for item in tasks.split(','):
+        m = re.match(r"^(\d+)(?:-(\d+)(?::(\d+))?)?$", item.strip())
+        if m is None:
+            raise ValueError("Invalid task range: {}".format(tasks))
+        first = int(m.group(1))
+        last = int(m.group(2)) if m.group(2) else first
+        step = int(m.group(3)) if m.group(3) else 1
+        yield first, last, step
+
+
+def parse_tasks(tasks):
+    """Expand a GE task list such as "1-10:2" or "1,3,5-7" into task numbers."""
+    if not tasks:
+        return []
+
+    numbers = []
+    for first, last, step in _task_ranges(tasks):
+        numbers.extend(xrange(first, last+1, step))
+    return numbers
+
+
+def count_tasks(tasks):
+    """Number of tasks in a GE task list, without expanding it."""
+    if not tasks:
+        return 0
+    return sum(len(xrange(first, last+1, step)) for first, last, step in _task_ranges(tasks))
+
+
+def code2state(code):
+    if 'E' in code:
+        return ERROR
+    if 'r' in code or 't' in code:
+        return RUNNING
+    return PENDING
+
+
+def combine_states(states):
+    """State of a whole job from the states of its tasks: alive while any task is, failed if any task failed."""
+    for state in (RUNNING, ERROR, PENDING, UNKNOWN, FAILED):
+        if state in states:
+            return state
+    return DONE
+
+
+def parse_qstat_xml(text):
+    """Return {(job_id, task): state} for the jobs listed in `qstat -xml` output.
+
+    `task` is None for non-array jobs.
+    """
+    states = {}
+    for job in ET.fromstring(text).iter("job_list"):
+        job_id = int(job.findtext("JB_job_number"))
+        state = code2state(job.findtext("state", ''))
+        tasks = parse_tasks(job.findtext("tasks"))
+        for task in tasks or [None]:
+            states[(job_id, task)] = state
+    return states
+
+
+def parse_qstat_times(text):
+    """Return {job_id: (name, time)} for `qstat -xml` output.
+
+    `time` is the submission time of pending jobs and the start time of
+    running ones, in seconds since the epoch.
+    """
+    jobs = {}
+    for job in ET.fromstring(text).iter("job_list"):
+        stamp = job.findtext("JB_submission_time") or job.findtext("JAT_start_time")
+        if not stamp:
+            continue
+        jobs[int(job.findtext("JB_job_number"))] = (
+            job.findtext("JB_name"), time.mktime(time.strptime(stamp[:19], "%Y-%m-%dT%H:%M:%S"))
+        )
+    return jobs
+
+
+def parse_qacct(text):
+    """Split `qacct -j` output into one dict per accounting record."""
+    records = []
+    record = None
+    for line in text.splitlines():
+        if line.startswith("====="):
+            record = {}
+            records.append(record)
+            continue
+        if record is None or not line.strip():
+            continue
+        key, _, value = line.partition(' ')
+        record[key] = value.strip()
+    return records
+
+
+def record2state(record):
+    failed = record.get("failed", '0').split()[0]
+    exit_status = record.get("exit_status", '0').split()[0]
+    return DONE if failed == '0' and exit_status == '0' else FAILED
+
+
+class _LeafCollector(object):
+    def __init__(self):
+        self.nodes = []
+
+    def add(self, job):
+        self.nodes.append(job)
+
+    def link(self, upstream, job, as_array=False):
+        pass
+
+    def link_all(self, upstreams, target, as_array=False):
+        pass
+
+
+def target2keys(target):
+    """List the (job_id, task) pairs of a job, a pipeline tree or a (job, tasks) pair."""
+    if isinstance(target, tuple) and len(target) == 2 and not hasattr(target[1], "_flatten"):
+        job, tasks = target
+        job_id = job if isinstance(job, (int, long)) else job.job_id
+        return [(job_id, task) for task in tasks]
+
+    collector = _LeafCollector()
+    target._flatten(collector)
+    keys = []
+    for job in collector.nodes:
+        if job.job_id is None:
+            raise ValueError("Job has not been submitted yet: {}".format(job.name))
+        keys += [(job.job_id, task) for task in parse_tasks(job.array) or [None]]
+    return keys
+
+
+class GEFuture(object):
+    """Result of `GEMonitor.wait_async`; resolves to {(job_id, task): state}."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self._event = threading.Event()
+        self._result = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise RuntimeError("Timed out waiting for jobs")
+        return self._result
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _set_result(self, result):
+        with self._lock:
+            self._result = result
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class GEMonitor(object):
+    """Track submitted jobs and poll all of them with one `qstat -xml` per interval.
+
+    Jobs which have left qstat are looked up once with qacct.
+    `qstat` and `qacct` are callables returning the command output,
+    so recorded outputs can be replayed in place of a live GridEngine.
+    The time from tracking to the first poll which sees a job running is kept
+    in `queue_waits` for the last `recent` jobs.
+    """
+
+    def __init__(self, qstat=run_qstat, qacct=run_qacct, interval=30, recent=100, clock=time.time):
+        self.qstat = qstat
+        self.qacct = qacct
+        self.interval = interval
+        self.clock = clock
+        self.states = {}
+        self.records = {}
+        self.queue_waits = collections.deque(maxlen=recent)
+        self._tracked_at = {}
+        self._futures = []
+        self._lock = threading.Lock()
+        self._poller = None
+
+    def track(self, job):
+        """Follow a submitted job as a whole; its array tasks are only followed once waited for."""
+        key = (job.job_id, None)
+        now = self.clock()
+        with self._lock:
+            if key not in self.states:
+                self.states[key] = UNKNOWN
+                self._tracked_at[key] = now
+
+    def state(self, job_id, task=None):
+        return self.states.get((job_id, task), UNKNOWN)
+
+    def set_state(self, job_id, state, task=None):
+        """Record the state of a job which is not run by GridEngine, e.g. one run locally."""
+        with self._lock:
+            self.states[(job_id, task)] = state
+            self._tracked_at.pop((job_id, task), None)
+
+    def queue_wait(self, default=None):
+        """Median of the recent queue waits in seconds, or `default` if none were seen."""
+        waits = sorted(self.queue_waits)
+        if not waits:
+            return default
+        return waits[len(waits) // 2]
+
+    def poll(self):
+        current = parse_qstat_xml(self.qstat())
+        by_job = {}
+        for (job_id, _), state in current.items():
+            by_job.setdefault(job_id, set()).add(state)
+
+        with self._lock:
+            active = [key for key, state in self.states.items() if state not in FINISHED]
+        gone = set()
+        updates = {}
+        for key in active:
+            if key in current:
+                updates[key] = current[key]
+            elif (key[0], None) in current:
+                updates[key] = current[(key[0], None)]
+            elif key[1] is None and key[0] in by_job:
+                updates[key] = combine_states(by_job[key[0]])  # an array job followed as a whole
+            else:
+                gone.add(key[0])
+
+        for job_id in sorted(gone):
+            try:
+                records = parse_qacct(self.qacct(job_id))
+            except subprocess.CalledProcessError:
+                continue  # accounting is not written yet
+            finals = []
+            for record in records:
+                task = record.get("taskid", "undefined")
+                key = (job_id, None if task == "undefined" else int(task))
+                self.records[key] = record
+                updates.setdefault(key, record2state(record))
+                finals.append(updates[key])
+            if finals:
+                updates.setdefault((job_id, None), combine_states(finals))
+
+        now = self.clock()
+        with self._lock:
+            for key in active:
+                if key in updates:
+                    self.states[key] = updates[key]
+                    if updates[key] != PENDING and key in self._tracked_at:
+                        tracked_at = self._tracked_at.pop(key)
+                        if updates[key] == RUNNING:
+                            self.queue_waits.append(now - tracked_at)
+        return updates
+
+    def _finished(self, keys):
+        states = dict((key, self.states.get(key, UNKNOWN)) for key in keys)
+        if all(state in FINISHED for state in states.values()):
+            return states
+        return None
+
+    def wait_async(self, target):
+        keys = target2keys(target)
+        future = GEFuture(keys)
+        with self._lock:
+            for key in keys:
+                self.states.setdefault(key, UNKNOWN)
+            self._futures.append(future)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop)
+                self._poller.daemon = True
+                self._poller.start()
+        return future
+
+    def wait(self, target, timeout=None):
+        return self.wait_async(target).result(timeout)
+
+    def _poll_loop(self):
+        while True:
+            try:
+                self.poll()
+            except (subprocess.CalledProcessError, OSError, ET.ParseError):
+                pass  # qmaster is busy or unreachable; try again next interval
+            resolved = []
+            with self._lock:
+                for future in self._futures:
+                    states = self._finished(future.keys)
+                    if states is not None:
+                        resolved.append((future, states))
+                for future, _ in resolved:
+                    self._futures.remove(future)
+                if not self._futures:
+                    self._poller = None
+            for future, states in resolved:
+                future._set_result(states)
+            if self._poller is None:
+                return
+            time.sleep(self.interval)
+
+
+_default_monitor = GEMonitor()
+
+
+def get_monitor():
+    return _default_monitor
+
+
+def set_monitor(monitor):
+    global _default_monitor
+    _default_monitor = monitor
@@ -1,29 +1,151 @@
-import subprocess
 import os
 from os import path
 import re
-import sys
-from itertools import product
+import copy
+import time
+import heapq
+import hashlib
 from collections import Iterable
 
+from submitter import Submitter
+from monitor import get_monitor
+from backend import get_backend
+from resolver import has_path, check_commands
+from events import emit, enabled, CONSTRUCT, BUILD, QSUB
+from argtable import write_table, table_length, ZIP, PRODUCT
+
+
+SIMPLE, YESNO, FLAG, COMMASEP, KEYVALUE = range(5)
+
+# qsub options in command line order; hold options are spliced in between
+# so that appending a hold does not require recompiling the rest.
+HEAD_OPTIONS = (
+    ("-@", "optionfile", SIMPLE),
+    ("-a", "exectime", SIMPLE),
+    ("-ar", "ar_id", SIMPLE),
+    ("-A", "account_string", SIMPLE),
+    ("-c", "checkpoint", SIMPLE),
+    ("-ckpt", "ckpt", SIMPLE),
+    ("-C", "prefix_string", SIMPLE),
+    ("-display", "display", SIMPLE),
+    ("-dl", "deadline", SIMPLE),
+    ("-js", "job_share", SIMPLE),
+    ("-jsv", "jsv", SIMPLE),
+    ("-m", "mail", SIMPLE),
+    ("-N", "name", SIMPLE),
+    ("-P", "project_name", SIMPLE),
+    ("-p", "priority", SIMPLE),
+    ("-t", "array", SIMPLE),
+    ("-tc", "max_running", SIMPLE),
+    ("-w", "validation_level", SIMPLE),
+    ("-wd", "working_dir", SIMPLE),
+    ("-b", "binary", YESNO),
+    ("-j", "join", YESNO),
+    ("-now", "now", YESNO),
+    ("-pty", "pty", YESNO),
+    ("-R", "reservation", YESNO),
+    ("-r", "rerun", YESNO),
+    ("-shell", "shell", YESNO),
+    ("-sync", "sync", YESNO),
+    ("-clear", "clear", FLAG),
+    ("-cwd", "cwd", FLAG),
+    ("-hard", "hard", FLAG),
+    ("-h", "hold", FLAG),
+    ("-notify", "notify", FLAG),
+    ("-soft", "soft", FLAG),
+    ("-terse", "terse", FLAG),
+    ("-verify", "verify", FLAG),
+    ("-V", "allval", FLAG),
+    ("-dc", "delete_contexts", COMMASEP),
+    ("-e", "stderr", COMMASEP)
+)
+HOLD_OPTIONS = (
+    ("-hold_jid", "hold_jid", COMMASEP),
+    ("-hold_jid_ad", "hold_jid_ad", COMMASEP)
+)
+TAIL_OPTIONS = (
+    ("-i", "stdin", COMMASEP),
+    ("-M", "mail_address", COMMASEP),
+    ("-masterq", "masterq", COMMASEP),
+    ("-o", "stdout", COMMASEP),
+    ("-q", "queue", COMMASEP),
+    ("-S", "interpreter", COMMASEP),
+    ("-u", "username", COMMASEP),
+    ("-sc", "set_contexts", KEYVALUE),
+    ("-v", "var", KEYVALUE),
+    ("-ac", "additional_contexts", KEYVALUE),
+    ("-l", "resource", KEYVALUE)
+)
+
+LIST_OPTIONS = frozenset(name for _, name, kind in HEAD_OPTIONS + HOLD_OPTIONS + TAIL_OPTIONS if kind == COMMASEP)
+HOLD_NAMES = frozenset(name for _, name, _ in HOLD_OPTIONS)
+# job attributes which are not passed to qsub
+META_LISTS = frozenset(["inputs", "outputs"])
+META_NAMES = META_LISTS | frozenset(["cacheable"])
+OPTION_NAMES = frozenset(
+    [name for _, name, _ in HEAD_OPTIONS + HOLD_OPTIONS + TAIL_OPTIONS] +
+    ["command", "args", "binding", "parallel_env", "verbose"]
+) | META_NAMES
+
+# position of each qsub option in the command line, to compile only the options which are set
+OPTION_ORDER = dict((name, (i, arg, kind)) for i, (arg, name, kind) in enumerate(HEAD_OPTIONS + TAIL_OPTIONS))
+
+# unset options read as these; containers are created per job on first access
+MUTABLE_DEFAULTS = dict([(name, list) for name in LIST_OPTIONS] +
+                        [("args", list), ("resource", dict), ("var", dict), ("parallel_env", dict)])
+DEFAULTS = {"terse": True}
+
+
+def format_option(arg, kind, val):
+    if kind == SIMPLE:
+        return [arg, val] if val is not None else []
+    elif kind == YESNO:
+        if val is True:
+            return [arg, "yes"]
+        elif val is False:
+            return [arg, "no"]
+        return []
+    elif kind == FLAG:
+        return [arg] if val is True else []
+    elif kind == COMMASEP:
+        return [arg, ','.join(map(str, val))] if val else []
+    elif kind == KEYVALUE:
+        return [arg, ','.join([("{}={}".format(k, v) if v else k) for k, v in val.items()])] if val else []
+
 
 class GEJob(object):
+    """A qsub job.
+
+    Options are kept in a per-job dict holding only the options that were set;
+    unset ones read as their defaults. The command line is compiled once and
+    reused until an option other than a hold is assigned (or a container
+    option is taken out for modification).
+    """
+
+    __slots__ = ("_opts", "_head", "_tail", "commandline", "additionals", "job_id", "next_job")
+
     default_mail = 'n'
     default_mail_address = None
+    lazy_check = False  # check commands in one batch at submission instead of in each constructor
 
-    @staticmethod
-    def has_path(command):
-        for p in os.getenv("PATH").split(path.pathsep):
-            if path.exists(path.join(p, command)):
-                return True
-        return False
+    has_path = staticmethod(has_path)
 
     @staticmethod
     def iter_or_item2list(val):
         if val is None:
             return []
         elif isinstance(val, Iterable) and not isinstance(val, basestring):
-            return reduce(lambda a, b: a+b, map(GEJob.iter_or_item2list, val), [])
+            flat = []
+            stack = [iter(val)]
+            while stack:
+                for item in stack[-1]:
+                    if isinstance(item, Iterable) and not isinstance(item, basestring):
+                        stack.append(iter(item))
+                        break
+                    flat.append(item)
+                else:
+                    stack.pop()
+            return flat
         else:
             return [val]
 
@@ -86,260 +208,319 @@ class GEJob(object):
                  allval=None,
                  validation_level=None,
                  working_dir=None,
+                 inputs=None,  # files read by the job
+                 outputs=None,  # files written by the job
+                 cacheable=None,  # outputs may be reused from a GECache
                  **kwargs):
+        start = time.time() if enabled(CONSTRUCT) else None
 
-        if not (path.isfile(command) or self.has_path(command)):
-            raise IOError("Script/Binary not found: {}".format(command))
-
-        self.command = command
-        self.args = [] if args is None else args
-
-        self.optionfile = optionfile
-        self.exectime = exectime
-        self.additional_contexts = additional_contexts
-        self.ar_id = ar_id
-        self.account_string = account_string
-        self.binary = binary
-        self.binding = binding
-        self.checkpoint = checkpoint
-        self.ckpt = ckpt
-        self.clear = clear
-        self.cwd = cwd
-        self.prefix_string = prefix_string
-        self.delete_contexts = self.iter_or_item2list(delete_contexts)
-        self.display = display
-        self.deadline = deadline
-        self.stderr = self.iter_or_item2list(stderr)
-        self.hard = hard
-        self.hold = hold
-        self.hold_jid = [] if hold_jid is None else self.iter_or_item2list(hold_jid)
-        self.hold_jid_ad = [] if hold_jid_ad is None else self.iter_or_item2list(hold_jid_ad)
-        self.stdin = self.iter_or_item2list(stdin)
-        self.join = join
-        self.job_share = job_share
-        self.jsv = jsv
-
-        self.resource = {} if resource is None else resource
-        if mem:
-            self.resource["s_vmem"] = mem
-            self.resource["mem_req"] = mem
-
-        self.mail = GEJob.default_mail if mail is None else mail
-        self.mail_address = self.iter_or_item2list(GEJob.default_mail_address if mail_address is None else mail_address)
-        self.masterq = self.iter_or_item2list(masterq)
-        self.notify = notify
-        self.now = now
+        if not self.lazy_check:
+            check_commands([command])
 
-        self.name = path.basename(self.command) if name is None else name
-        if re.match("^\d", self.name):
-            raise ValueError("Invalid job name (cannot start with a digit): {}".format(self.name))
+        if mem:
+            resource = {} if resource is None else resource
+            resource["s_vmem"] = mem
+            resource["mem_req"] = mem
 
-        self.stdout = self.iter_or_item2list(stdout)
-        self.project_name = project_name
-        self.priority = priority
+        if name is None:
+            name = path.basename(command)
+        if re.match("^\d", name):
+            raise ValueError("Invalid job name (cannot start with a digit): {}".format(name))
 
-        self.parallel_env = parallel_env if parallel_env else {}
         if slot:
-            self.parallel_env = dict(def_slot=[slot])
-
-        self.pty = pty
-        self.queue = self.iter_or_item2list(queue)
-        self.reservation = reservation
-        self.rerun = rerun
-        self.set_contexts = set_contexts
-        self.shell = shell
-        self.soft = soft
-        self.sync = sync
-        self.interpreter = self.iter_or_item2list(interpreter)
-        self.array = array
-        self.max_running = max_running
-        self.terse = True  # terse will be ignored
-        self.username = self.iter_or_item2list(username)
-        self.var = {} if var is None else var
-        self.verbose = verbose
-        self.verify = verify
-        self.allval = allval
-        self.validation_level = validation_level
-        self.working_dir = working_dir
+            parallel_env = dict(def_slot=[slot])
+
+        opts = dict(
+            command=command,
+            args=args,
+            optionfile=optionfile,
+            exectime=exectime,
+            additional_contexts=additional_contexts,
+            ar_id=ar_id,
+            account_string=account_string,
+            binary=binary,
+            binding=binding,
+            checkpoint=checkpoint,
+            ckpt=ckpt,
+            clear=clear,
+            cwd=cwd,
+            prefix_string=prefix_string,
+            delete_contexts=delete_contexts,
+            display=display,
+            deadline=deadline,
+            stderr=stderr,
+            hard=hard,
+            hold=hold,
+            hold_jid=hold_jid,
+            hold_jid_ad=hold_jid_ad,
+            stdin=stdin,
+            join=join,
+            job_share=job_share,
+            jsv=jsv,
+            resource=resource,
+            mail=GEJob.default_mail if mail is None else mail,
+            mail_address=GEJob.default_mail_address if mail_address is None else mail_address,
+            masterq=masterq,
+            notify=notify,
+            now=now,
+            name=name,
+            stdout=stdout,
+            project_name=project_name,
+            priority=priority,
+            parallel_env=parallel_env,
+            pty=pty,
+            queue=queue,
+            reservation=reservation,
+            rerun=rerun,
+            set_contexts=set_contexts,
+            shell=shell,
+            soft=soft,
+            sync=sync,
+            interpreter=interpreter,
+            array=array,
+            max_running=max_running,
+            username=username,
+            var=var,
+            verbose=verbose,
+            verify=verify,
+            allval=allval,
+            validation_level=validation_level,
+            working_dir=working_dir,
+            inputs=inputs,
+            outputs=outputs,
+            cacheable=cacheable
+        )
+        for key in LIST_OPTIONS | META_LISTS:
+            if opts[key] is not None:
+                opts[key] = self.iter_or_item2list(opts[key])
+
+        self._opts = dict((k, v) for k, v in opts.iteritems() if v is not None and not (v == [] or v == {}))
+        self._head = None
+        self._tail = None
 
         self.additionals = kwargs
         self.job_id = None
-        self.next_job = []
+        self.next_job = ()
+
+        if start is not None:
+            emit(CONSTRUCT, name=name, duration=time.time() - start)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in OPTION_NAMES:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+        opts = self._opts
+        if name in opts:
+            value = opts[name]
+        elif name in MUTABLE_DEFAULTS:
+            value = opts[name] = MUTABLE_DEFAULTS[name]()
+        else:
+            return DEFAULTS.get(name)
+
+        if name in MUTABLE_DEFAULTS and name not in HOLD_NAMES:
+            self._head = None  # the caller may modify it in place
+        return value
+
+    def __setattr__(self, name, value):
+        if name in OPTION_NAMES:
+            if value is None:
+                self._opts.pop(name, None)
+            else:
+                self._opts[name] = value
+            if name not in HOLD_NAMES and name not in META_NAMES:
+                self._head = None
+        else:
+            object.__setattr__(self, name, value)
 
     def append_hold_jid(self, jid):
-        self.hold_jid += self.iter_or_item2list(jid)
+        self._opts.setdefault("hold_jid", []).extend(self.iter_or_item2list(jid))
 
     def append_hold_jid_ad(self, jid):
-        self.hold_jid_ad += self.iter_or_item2list(jid)
+        self._opts.setdefault("hold_jid_ad", []).extend(self.iter_or_item2list(jid))
 
     def append_next_job(self, job, as_array=False):
+        if not self.next_job:
+            self.next_job = []
         self.next_job.append((job, as_array))
 
+    def copy(self):
+        """Return an unsubmitted copy of this job with the same options but no holds or dependents."""
+        job = type(self).__new__(type(self))
+        job._opts = dict((name, copy.deepcopy(value)) for name, value in self._opts.items() if name not in HOLD_NAMES)
+        job._head = None
+        job._tail = None
+        job.additionals = dict(self.additionals)
+        job.job_id = None
+        job.next_job = ()
+        return job
+
+    def _compile(self):
+        opts = self._opts
+        get = opts.get
+
+        options = dict(DEFAULTS)
+        options.update(opts)
+        head = ["qsub"]
+        tail = []
+        for (i, arg, kind), val in sorted((OPTION_ORDER[name], val) for name, val in options.iteritems()
+                                          if name in OPTION_ORDER):
+            (head if i < len(HEAD_OPTIONS) else tail).extend(format_option(arg, kind, val))
+
+        binding = get("binding")
+        if binding:
+            tail += ["-binding"] + binding
+
+        parallel_env = get("parallel_env")
+        if parallel_env:
+            k, v = parallel_env.items()[0]
+            tail += ["-pe", k, ','.join(map(str, v))]
+
+        tail.append(opts["command"])
+        tail += get("args", ())
+
+        self._head = map(str, head)
+        self._tail = map(str, tail)
+
     def _build_command(self):
-        self.commandline = ["qsub"]
-
-        simpleargs = (
-            ("-@", "optionfile"),
-            ("-a", "exectime"),
-            ("-ar", "ar_id"),
-            ("-A", "account_string"),
-            ("-c", "checkpoint"),
-            ("-ckpt", "ckpt"),
-            ("-C", "prefix_string"),
-            ("-display", "display"),
-            ("-dl", "deadline"),
-            ("-js", "job_share"),
-            ("-jsv", "jsv"),
-            ("-m", "mail"),
-            ("-N", "name"),
-            ("-P", "project_name"),
-            ("-p", "priority"),
-            ("-t", "array"),
-            ("-tc", "max_running"),
-            ("-w", "validation_level"),
-            ("-wd", "working_dir")
-        )
-        for arg, name in simpleargs:
-            val = getattr(self, name)
-            if val is not None:
-                self.commandline += [arg, val]
-
-        ynargs = (
-            ("-b", "binary"),
-            ("-j", "join"),
-            ("-now", "now"),
-            ("-pty", "pty"),
-            ("-R", "reservation"),
-            ("-r", "rerun"),
-            ("-shell", "shell"),
-            ("-sync", "sync")
-        )
-        for arg, name in ynargs:
-            val = getattr(self, name)
-            if val is not None:
-                if val is True:
-                    self.commandline += [arg, "yes"]
-                elif val is False:
-                    self.commandline += [arg, "no"]
-
-        flagvals = (
-            ("-clear", "clear"),
-            ("-cwd", "cwd"),
-            ("-hard", "hard"),
-            ("-h", "hold"),
-            ("-notify", "notify"),
-            ("-soft", "soft"),
-            ("-terse", "terse"),
-            ("-verify", "verify"),
-            ("-V", "allval")
-        )
-        for arg, name in flagvals:
-            val = getattr(self, name)
-            if val is True:
-                self.commandline.append(arg)
-
-        commasepargs = (
-            ("-dc", "delete_contexts"),
-            ("-e", "stderr"),
-            ("-hold_jid", "hold_jid"),
-            ("-hold_jid_ad", "hold_jid_ad"),
-            ("-i", "stdin"),
-            ("-M", "mail_address"),
-            ("-masterq", "masterq"),
-            ("-o", "stdout"),
-            ("-q", "queue"),
-            ("-S", "interpreter"),
-            ("-u", "username")
-        )
-        for arg, name in commasepargs:
-            val = getattr(self, name)
-            if val:
-                self.commandline += [arg, ','.join(map(str, val))]
-
-        kvargs = (
-            ("-sc", "set_contexts"),
-            ("-v", "var"),
-            ("-ac", "additional_contexts"),
-            ("-l", "resource")
-        )
-        for arg, name in kvargs:
-            val = getattr(self, name)
-            if val:
-                self.commandline += [arg, ','.join([("{}={}".format(k, v) if v else k) for k, v in val.items()])]
+        start = time.time() if enabled(BUILD) else None
+        cached = self._head is not None
+        if not cached:
+            self._compile()
 
-        if self.binding:
-            self.commandline += ["-binding"] + self.binding
+        holds = []
+        for arg, name, kind in HOLD_OPTIONS:
+            holds += format_option(arg, kind, self._opts.get(name))
 
-        if self.parallel_env:
-            k, v = self.parallel_env.items()[0]
-            self.commandline += ["-pe", k, ','.join(map(str, v))]
+        self.commandline = self._head + map(str, holds) + self._tail
+        if start is not None:
+            emit(BUILD, name=self.name, duration=time.time() - start, argc=len(self.commandline), cached=cached)
 
-        self.commandline.append(self.command)
+    def _commands(self):
+        return [self.command]
 
-        if self.args:
-            self.commandline += self.args
+    def _entries(self):
+        return [self]
 
-        self.commandline = map(str, self.commandline)
+    def _flatten(self, graph):
+        graph.add(self)
+        for next_job, as_array in self.next_job:
+            graph.link_all([self], next_job, as_array)
+            next_job._flatten(graph)
+        return [self]
+
+    def _result(self):
+        return self.job_id
 
-    def submit(self):
+    def _qsub(self, backend=None):
         if self.job_id is not None:
             raise IOError("This job has already been submitted as {}".format(self.job_id))
 
-        sys.stdout.write("{}\t-> ".format(self.name))
-
         self._build_command()
 
-        stdout = subprocess.check_output(self.commandline)
+        start = time.time()
+        stdout = (get_backend() if backend is None else backend).submit(self.commandline, self)
         if '.' in stdout:
             job_id, self.array = stdout.rstrip().split('.')
         else:
             job_id, self.array = stdout.rstrip(), None
         self.job_id = int(job_id)
+        emit(QSUB, name=self.name, job_id=self.job_id, argc=len(self.commandline), duration=time.time() - start)
+        get_monitor().track(self)
 
-        sys.stdout.write("{}{} [ SUBMITTED ]".format(self.job_id, ('.' + self.array) if self.array else ''))
+        return self.job_id
+
+    def _identity(self):
+        """The compiled command line without holds, which identifies the job across runs."""
+        if self._head is None:
+            self._compile()
+        return self._head + self._tail
+
+    def _format_submitted(self, status="SUBMITTED"):
+        line = "{}\t-> {}{} [ {} ]".format(self.name, '-' if self.job_id is None else self.job_id,
+                                           ('.' + self.array) if self.array and self.job_id is not None else '',
+                                           status)
         holds = []
         holds += self.hold_jid if self.hold_jid else []
         holds += self.hold_jid_ad if self.hold_jid_ad else []
-        print " (waiting {})".format(','.join(map(str, holds))) if holds else ''
+        return line + (" (waiting {})".format(','.join(map(str, holds))) if holds else '')
 
-        for next_job, as_array in self.next_job:
-            if as_array:
-                next_job.append_hold_jid_ad(self.job_id)
-            else:
-                next_job.append_hold_jid(self.job_id)
-            next_job.submit()
-
-        return self.job_id
+    def submit(self, workers=1, backend=None):
+        return Submitter(workers, backend).submit(self)
 
 
 class GEArrayJob(GEJob):
+    __slots__ = ("table", "status", "stats", "output", "rows", "attempt", "combinations", "ntasks", "user_command")
+
     INTERPRETER = "python"
     ARRAYRUNNER = path.join(path.dirname(path.abspath(__file__)), "arrayrunner.py")
+    TABLE_DIR = ".gerunner"
+    CHUNK_TASKS = 1000  # tasks sharing one captured output chunk file
 
-    def __init__(self, command, make_combination=False, **kwargs):
+    def __init__(self, command, make_combination=False, table_dir=None, per_task=None, max_tasks=None,
+                 profile=False, capture=False, **kwargs):
         super(GEArrayJob, self).__init__(command, **kwargs)
 
         args = tuple(kwargs["arg{}".format(i)] for i in range(1, 100) if "arg{}".format(i) in kwargs)
 
-        if make_combination:
-            args = zip(*product(*args))
-        else:
-            args = zip(*zip(*args))
+        mode = PRODUCT if make_combination else ZIP
+        args = [list(arg) for arg in args]
 
         self.cwd = True
         self.binary = True
+        self.combinations = table_length(map(len, args), mode)
+        self.ntasks = self.combinations
+        if per_task:
+            self.ntasks = -(-self.combinations // per_task)
+        if max_tasks:
+            self.ntasks = min(self.ntasks, max_tasks)
         if not self.array:
-            self.array = "1-{}".format(len(args[0]))
+            self.array = "1-{}".format(self.ntasks)
         self.var["PATH"] = os.environ.get("PATH", '')
         self.var["LD_LIBRARY_PATH"] = os.environ.get("LD_LIBRARY_PATH", '')
 
-        arraycommand = [self.ARRAYRUNNER]
-        for i, arg in enumerate(args):
-            arraycommand += ["-{}".format(i+1)] + ['"{}"'.format(str(x).replace('"', '\"')) for x in arg]
+        self.table = write_table(args, self.TABLE_DIR if table_dir is None else table_dir,
+                                 prefix="{}.".format(self.name), mode=mode)
+        self.status = self.table + ".status"
+        self.stats = self.table + ".stats" if profile else None
+        self.output = self.table + ".out" if capture else None
+        self.rows = None
+        self.attempt = 0
+        if capture:
+            # rows write to the chunk files; the runner's own errors go to one file shared by all tasks
+            self.stdout = self.stdout or ["/dev/null"]
+            self.stderr = self.stderr or [self.table + ".err"]
+
+        arraycommand = [self.ARRAYRUNNER, "--table", self.table] + self._runner_options()
         self.args = arraycommand + ["--", self.command] + ['"{}"'.format(x.replace('"', '\"')) for x in self.args]
 
+        self.user_command = self.command
         self.command = self.INTERPRETER
 
+    def copy(self):
+        job = super(GEArrayJob, self).copy()
+        for name in GEArrayJob.__slots__:
+            setattr(job, name, getattr(self, name))
+        return job
+
+    def _runner_options(self):
+        options = ["--status", self.status]
+        if self.stats:
+            options += ["--stats", self.stats]
+        if self.output:
+            options += ["--output", self.output, "--chunk-tasks", str(self.CHUNK_TASKS)]
+        return options
+
+    def _commands(self):
+        return [self.user_command]
+
+    def _identity(self):
+        digests = {self.status: "status", self.stats: "stats", self.output: "output"}
+        for filename in (self.table, self.rows):
+            if filename is not None:
+                with open(filename, "rb") as f:
+                    digests[filename] = hashlib.sha1(f.read()).hexdigest()
+        return [digests.get(arg, arg) for arg in super(GEArrayJob, self)._identity()]
+
 
 class GESeriesJob(object):
     def __init__(self, jobs, as_array=False):
@@ -352,16 +533,22 @@ class GESeriesJob(object):
     def append_hold_jid_ad(self, jid):
         self.jobs[0].append_hold_jid_ad(jid)
 
-    def submit(self):
-        for job, next_job in zip(self.jobs, self.jobs[1:]+[None]):
-            hold_jid = job.submit()
-            if next_job is not None:
-                if self.as_array:
-                    next_job.append_hold_jid_ad(hold_jid)
-                else:
-                    next_job.append_hold_jid(hold_jid)
+    def _entries(self):
+        return self.jobs[0]._entries()
+
+    def _flatten(self, graph):
+        exits = None
+        for job in self.jobs:
+            if exits is not None:
+                graph.link_all(exits, job, self.as_array)
+            exits = job._flatten(graph)
+        return exits
+
+    def _result(self):
+        return self.jobs[-1]._result()
 
-        return hold_jid
+    def submit(self, workers=1, backend=None):
+        return Submitter(workers, backend).submit(self)
 
 
 class GEParallelJob(object):
@@ -377,8 +564,104 @@ class GEParallelJob(object):
         for job in self.jobs:
             job.append_hold_jid_ad(jid)
 
-    def submit(self):
-        return tuple(job.submit() for job in self.jobs)
+    def _entries(self):
+        return [entry for job in self.jobs for entry in job._entries()]
+
+    def _flatten(self, graph):
+        return [leaf for job in self.jobs for leaf in job._flatten(graph)]
+
+    def _result(self):
+        return tuple(job._result() for job in self.jobs)
+
+    def submit(self, workers=1, backend=None):
+        return Submitter(workers, backend).submit(self)
+
+
+class GEDAGJob(object):
+    def __init__(self, jobs=None):
+        self.jobs = []
+        self.deps = {}
+        for job in GEJob.iter_or_item2list(jobs):
+            self.add(job)
+
+    def add(self, job, after=None, after_array=None):
+        if job not in self.deps:
+            self.jobs.append(job)
+            self.deps[job] = []
+
+        for upstream in GEJob.iter_or_item2list(after):
+            self.add(upstream)
+            self.deps[job].append((upstream, False))
+
+        for upstream in GEJob.iter_or_item2list(after_array):
+            self.add(upstream)
+            if isinstance(upstream, GEArrayJob) and isinstance(job, GEArrayJob) and upstream.ntasks != job.ntasks:
+                raise ValueError("Array size mismatch for hold_jid_ad: {} ({} tasks) -> {} ({} tasks)".format(
+                    upstream.name, upstream.ntasks, getattr(job, "name", job), job.ntasks
+                ))
+            self.deps[job].append((upstream, True))
+
+        return job
+
+    def _sources(self):
+        return [job for job in self.jobs if not self.deps[job]]
+
+    def _sinks(self):
+        upstreams = set(upstream for job in self.jobs for upstream, _ in self.deps[job])
+        return [job for job in self.jobs if job not in upstreams]
+
+    def _order(self):
+        index = dict((job, i) for i, job in enumerate(self.jobs))
+        waiting = [len(self.deps[job]) for job in self.jobs]
+        dependents = [[] for _ in self.jobs]
+        for job in self.jobs:
+            for upstream, _ in self.deps[job]:
+                dependents[index[upstream]].append(index[job])
+
+        ready = [i for i, n in enumerate(waiting) if n == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            i = heapq.heappop(ready)
+            order.append(self.jobs[i])
+            for j in dependents[i]:
+                waiting[j] -= 1
+                if waiting[j] == 0:
+                    heapq.heappush(ready, j)
+
+        if len(order) != len(self.jobs):
+            cyclic = [getattr(job, "name", job) for i, job in enumerate(self.jobs) if waiting[i]]
+            raise ValueError("Dependency cycle among: {}".format(', '.join(map(str, cyclic))))
+        return order
+
+    def append_hold_jid(self, jid):
+        for job in self._sources():
+            job.append_hold_jid(jid)
+
+    def append_hold_jid_ad(self, jid):
+        for job in self._sources():
+            job.append_hold_jid_ad(jid)
+
+    def _entries(self):
+        return [entry for job in self._sources() for entry in job._entries()]
+
+    def _flatten(self, graph):
+        exits = {}
+        for job in self._order():
+            whole = [leaf for upstream, as_array in self.deps[job] if not as_array for leaf in exits[upstream]]
+            if whole:
+                graph.link_all(whole, job)
+            for upstream, as_array in self.deps[job]:
+                if as_array:
+                    graph.link_all(exits[upstream], job, as_array)
+            exits[job] = job._flatten(graph)
+        return [leaf for job in self._sinks() for leaf in exits[job]]
+
+    def _result(self):
+        return tuple(job._result() for job in self._sinks())
+
+    def submit(self, workers=1, backend=None):
+        return Submitter(workers, backend).submit(self)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,19 @@
 import argparse
 import sys
+import re
+import shlex
+from os import path
 
-from piperunner import GEJob
+from piperunner import GEJob, GESeriesJob, GEParallelJob, GEDAGJob
+
+# start of JID=$(qsub ...), JID="$(qsub ...)" or JID=`qsub ...`
+CAPTURE = re.compile(r"^(\w+)=\"?(\$\(|`)")
+VARIABLE = re.compile(r"^\$\{?(\w+)\}?$")
+# shell words ending a command: pipes, lists and background jobs
+CONTROL = frozenset(["|", "||", "&&", ";", "&", "|&"])
+# redirections such as >, 2>>, &>, <, with or without their target
+REDIRECT = re.compile(r"^(?:\d*|&)(?:>>?|<)&?")
+QSUB = re.compile(r"(?:^|[\s/(`;|&])qsub(?:\s|$)")
 
 
 def command2GEJob(commands):
@@ -61,7 +73,7 @@ class unlist_nargs1(argparse.Action):
         setattr(namespace, self.dest, values[0])
 
 
-def parse_args(commands=None):
+def make_parser():
     p = argparse.ArgumentParser(add_help=False,
                                 description="Argument parser for GE qsub command",
                                 epilog="refer qsub man page for details")
@@ -127,7 +139,164 @@ def parse_args(commands=None):
     p.add_argument("command", nargs=1, action=unlist_nargs1)
     p.add_argument("args", nargs=argparse.REMAINDER, metavar="command_arg")
 
-    return p.parse_args(commands)
+    return p
+
+
+_parser = None
+
+
+def get_parser():
+    global _parser
+    if _parser is None:
+        _parser = make_parser()
+    return _parser
+
+
+def parse_args(commands=None):
+    return get_parser().parse_args(commands)
+
+
+def _substitution_end(line, start, closing):
+    """Index of the `closing` character which ends the command substitution starting at `start`, or None."""
+    depth = 0
+    quote = None
+    i = start
+    while i < len(line):
+        c = line[i]
+        if quote is not None:
+            if c == '\\' and quote == '"':
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c == '\\':
+            i += 1
+        elif c in "'\"":
+            quote = c
+        elif closing == ')' and c == '(':
+            depth += 1
+        elif c == closing:
+            if depth == 0:
+                return i
+            depth -= 1
+        i += 1
+    return None
+
+
+def _command_words(words):
+    """The words of the first command of a shell list or pipeline, without its redirections."""
+    command = []
+    skip = False
+    for word in words:
+        if skip:
+            skip = False
+            continue
+        if word in CONTROL:
+            break
+        redirect = REDIRECT.match(word)
+        if redirect:
+            skip = redirect.end() == len(word)  # the target is the next word
+            continue
+        if word.endswith(';'):
+            command.append(word[:-1])
+            break
+        command.append(word)
+    return command
+
+
+def iter_commands(lines):
+    """Yield (variable, qsub arguments) for each qsub call in shell script `lines`.
+
+    Continued lines are joined and comments are skipped. `variable` is the
+    shell variable the job ID is captured into (`JID=$(qsub ...)`), or None.
+    The call ends at the first pipe, list or background operator, and its
+    redirections are dropped. Lines which do not call qsub are ignored;
+    ValueError is raised for a line which mentions qsub in a way that is not
+    understood, rather than leaving its job out.
+    """
+    buf = ''
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if line.endswith('\\'):
+            buf += line[:-1]
+            continue
+        line, buf = (buf + line).strip(), ''
+
+        if not line or line.startswith('#'):
+            continue
+
+        variable = None
+        command = line
+        captured = CAPTURE.match(line)
+        if captured:
+            end = _substitution_end(line, captured.end(), ')' if captured.group(2) == "$(" else '`')
+            if end is not None:
+                variable = captured.group(1)
+                command = line[captured.end():end]
+
+        words = _command_words(shlex.split(command, comments=True))
+        if words and path.basename(words[0]) == "qsub":
+            yield variable, words[1:]
+        elif QSUB.search(command):
+            raise ValueError("Cannot read the qsub call on line {}: {}".format(number, line))
+
+
+def script2pipeline(lines):
+    """Rebuild the pipeline submitted by the qsub calls in a shell script.
+
+    `lines` is an iterable of lines such as an open file. `-hold_jid` and
+    `-hold_jid_ad` references to the name (`-N`) of an earlier job or to
+    a captured job ID variable become dependencies; other references are kept
+    as plain holds. Commands are not looked up until the pipeline is submitted.
+    Returns a GESeriesJob for a single chain, a GEParallelJob for independent
+    jobs and a GEDAGJob otherwise.
+    """
+    parser = get_parser()
+    dag = GEDAGJob()
+    by_name = {}
+    by_variable = {}
+
+    def resolve(refs):
+        jobs, rest = [], []
+        for ref in refs or ():
+            variable = VARIABLE.match(ref)
+            if variable and variable.group(1) in by_variable:
+                jobs.append(by_variable[variable.group(1)])
+            elif ref in by_name:
+                jobs.extend(by_name[ref])
+            else:
+                rest.append(ref)
+        return jobs, rest
+
+    lazy_check = GEJob.lazy_check
+    GEJob.lazy_check = True
+    try:
+        for variable, words in iter_commands(lines):
+            opts = vars(parser.parse_args(words))
+            after, opts["hold_jid"] = resolve(opts["hold_jid"])
+            after_array, opts["hold_jid_ad"] = resolve(opts["hold_jid_ad"])
+            job = GEJob(**opts)
+            dag.add(job, after=after, after_array=after_array)
+
+            by_name.setdefault(job.name, []).append(job)
+            if variable is not None:
+                by_variable[variable] = job
+    finally:
+        GEJob.lazy_check = lazy_check
+
+    return simplify(dag)
+
+
+def simplify(dag):
+    """Return the jobs of `dag` as a GEParallelJob or GESeriesJob when it has that shape."""
+    jobs = dag.jobs
+    if not any(dag.deps[job] for job in jobs):
+        return GEParallelJob(jobs)
+
+    as_array = dag.deps[jobs[1]][0][1] if len(jobs) > 1 and dag.deps[jobs[1]] else False
+    chain = all(dag.deps[job] == [(upstream, as_array)] for upstream, job in zip(jobs, jobs[1:]))
+    if chain and not dag.deps[jobs[0]]:
+        return GESeriesJob(jobs, as_array=as_array)
+    return dag
 
 
 if __name__ == "__main__":
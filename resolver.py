@@ -0,0 +1,30 @@
+import os
+from os import path
+
+# (command, PATH, cwd) -> bool; misses are cached too
+_resolved = {}
+
+
+def has_path(command):
+    for p in os.getenv("PATH").split(path.pathsep):
+        if path.exists(path.join(p, command)):
+            return True
+    return False
+
+
+def command_exists(command):
+    key = (command, os.getenv("PATH"), None if path.isabs(command) else os.getcwd())
+    found = _resolved.get(key)
+    if found is None:
+        found = _resolved[key] = path.isfile(command) or has_path(command)
+    return found
+
+
+def check_commands(commands):
+    missing = sorted(set(command for command in commands if not command_exists(command)))
+    if missing:
+        raise IOError("Script/Binary not found: {}".format(', '.join(missing)))
+
+
+def clear_cache():
+    _resolved.clear()
@@ -0,0 +1,84 @@
+from os import path
+
+from piperunner import GEArrayJob
+from argtable import RowList, TaskStatus, task_slice, write_rows
+from monitor import get_monitor, parse_qacct, record2state, FAILED
+from simulator import parse_mem
+
+MEMORY_RESOURCES = ("s_vmem", "mem_req", "h_vmem")
+MB = 1024 ** 2
+
+
+def job_rows(job):
+    """Table rows run by `job` in task order."""
+    return RowList(job.rows) if job.rows is not None else xrange(job.combinations)
+
+
+def failed_rows(job, records=None):
+    """List the table rows of a finished `job` which did not exit with status 0.
+
+    The status markers written by arrayrunner.py are used when present;
+    rows which never ran count as failed. Otherwise all rows of the tasks
+    which failed according to `records` (the job's qacct records, looked
+    up if not given) are returned.
+    """
+    rows = job_rows(job)
+    if path.exists(job.status):
+        codes = TaskStatus(job.status).read(job.combinations)
+        return [row for row in rows if codes[row] != 0]
+
+    if records is None:
+        records = parse_qacct(get_monitor().qacct(job.job_id))
+    tasks = set(int(record["taskid"]) for record in records
+                if record.get("taskid", "undefined") != "undefined" and record2state(record) == FAILED)
+
+    failed = []
+    for task in sorted(tasks):
+        start, stop = task_slice(task - 1, job.ntasks, len(rows))
+        failed.extend(rows[i] for i in xrange(start, stop))
+    return failed
+
+
+def stricter_memory(job, factor):
+    resource = job.resource
+    for key in MEMORY_RESOURCES:
+        if key in resource:
+            resource[key] = "{}M".format(-(-int(parse_mem(resource[key]) * factor) // MB))
+
+
+def retry_failed(job, budget=3, mem_factor=1.5, aligned=False, per_task=None, records=None, table_dir=None):
+    """Return a GEArrayJob running only the failed rows of `job`, or None if no row failed.
+
+    The retry reads the same argument table and records its exit statuses in
+    the same status file, so its own failures can be retried in turn until
+    `budget` retries have been made (then IOError is raised). Memory requests
+    are multiplied by `mem_factor`. By default the failed rows become a
+    compact array (`per_task` rows per task); with `aligned`, the retry keeps
+    the task numbering of `job` and its tasks skip rows which already
+    succeeded, so `-hold_jid_ad` dependents line up with the original tasks.
+    """
+    rows = failed_rows(job, records)
+    if not rows:
+        return None
+    if job.attempt >= budget:
+        raise IOError("Retry budget ({}) exhausted for {}: {} rows still failing".format(budget, job.name, len(rows)))
+
+    retry = job.copy()
+    retry.attempt = job.attempt + 1
+
+    if aligned:
+        retry.rows = job.rows
+        retry.ntasks = job.ntasks
+        retry.array = job.array
+        options = ["--skip-done"] + (["--rows", job.rows] if job.rows else [])
+    else:
+        retry.rows = write_rows(rows, path.dirname(job.table) if table_dir is None else table_dir,
+                                prefix="{}.".format(job.name))
+        retry.ntasks = -(-len(rows) // per_task) if per_task else len(rows)
+        retry.array = "1-{}".format(retry.ntasks)
+        options = ["--rows", retry.rows]
+
+    command = job.args[job.args.index("--"):]
+    retry.args = [GEArrayJob.ARRAYRUNNER, "--table", retry.table] + retry._runner_options() + options + command
+    stricter_memory(retry, mem_factor)
+    return retry
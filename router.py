@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+import subprocess
+import xml.etree.ElementTree as ET
+from Queue import Queue
+
+from backend import GEBackend, get_backend, _option_value
+from monitor import get_monitor, PENDING, RUNNING, DONE, FAILED, FINISHED
+from critical import get_runtime
+from simulator import job_slots, job_mem, parse_mem
+from chainrunner import run_step
+
+# above the largest job ID GridEngine hands out (max_jobs_id)
+LOCAL_ID_BASE = 1000000000
+
+
+class LocalJob(object):
+    """A job run on this host by GERouter instead of being submitted."""
+
+    def __init__(self, job_id, job, runtime):
+        self.job_id = job_id
+        self.job = job
+        self.runtime = runtime
+        self.holds = [int(jid) for jid in job.hold_jid]
+        self.state = PENDING
+        self.exit_status = None
+        self.done = threading.Event()
+
+    def argv(self):
+        argv = map(str, [self.job.command] + list(self.job.args or ()))
+        if self.job.binary is True:
+            return argv
+        interpreter = self.job.interpreter[0] if self.job.interpreter else "/bin/sh"
+        return [interpreter] + argv
+
+    def workdir(self):
+        if self.job.cwd:
+            return os.getcwd()
+        if self.job.working_dir:
+            return self.job.working_dir
+        return os.environ.get("HOME")
+
+    def environ(self):
+        env = dict(os.environ)
+        env.update((key, str(value)) for key, value in (self.job.var or {}).items())
+        env.update(JOB_ID=str(self.job_id), JOB_NAME=self.job.name, SGE_TASK_ID="undefined",
+                   NSLOTS=str(job_slots(self.job)))
+        return env
+
+    def run(self):
+        step = dict(name=self.job.name, argv=self.argv(), shell=self.job.binary is True and self.job.shell is not False,
+                    stdout=self.job.stdout, stderr=self.job.stderr, join=bool(self.job.join))
+        try:
+            return run_step(step, self.workdir(), self.environ())
+        except (IOError, OSError):
+            return 1
+
+
+class GERouter(GEBackend):
+    """Backend wrapper which runs small jobs on this host when that is faster than queueing them.
+
+    A job is run locally if it requests at most `max_slots` slots and
+    `max_mem` memory, is not an array job, and its estimated runtime (from
+    `estimates`, a dict or callable as for `critical.assign_priorities`, e.g.
+    `GEHistory.estimate`) is below `max_runtime` and, multiplied by
+    `slowdown` and added to the work already queued in the `workers` local
+    slots, below the expected queue wait plus runtime on the cluster. The
+    queue wait is `queue_wait` seconds, or the median wait recently seen by
+    the monitor (`default_wait` until one was seen). Command lines submitted
+    without their GEJob always go to the cluster.
+
+    Local jobs get IDs from LOCAL_ID_BASE up and wait for their holds
+    (polling cluster jobs every `interval`). Cluster jobs holding on
+    unfinished local jobs are submitted with a user hold which is released
+    when those finish. As in GridEngine, holds are satisfied whatever the
+    exit status of the job held on.
+    """
+
+    def __init__(self, backend=None, workers=2, max_slots=1, max_mem="4G", max_runtime=600,
+                 estimates=None, default_runtime=None, queue_wait=None, default_wait=60,
+                 slowdown=1.0, interval=30, monitor=None, sleep=time.sleep):
+        self.backend = backend
+        self.workers = workers
+        self.max_slots = max_slots
+        self.max_mem = parse_mem(max_mem) if max_mem is not None else None
+        self.max_runtime = max_runtime
+        self.estimates = estimates
+        self.default_runtime = default_runtime
+        self.queue_wait = queue_wait
+        self.default_wait = default_wait
+        self.slowdown = slowdown
+        self.interval = interval
+        self.monitor = monitor
+        self.sleep = sleep
+
+        self.local = {}
+        self.next_id = LOCAL_ID_BASE
+        self.backlog = 0.0
+        self._held = []
+        self._queue = Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def inner(self):
+        return get_backend() if self.backend is None else self.backend
+
+    def _monitor(self):
+        return get_monitor() if self.monitor is None else self.monitor
+
+    def expected_wait(self):
+        if self.queue_wait is None:
+            return self._monitor().queue_wait(self.default_wait)
+        if callable(self.queue_wait):
+            return self.queue_wait()
+        return self.queue_wait
+
+    def route(self, job):
+        """Return (local, local cost, cluster cost) for `job`; costs are in seconds, None if not eligible."""
+        if job.array or job.hold or job.sync or job.hold_jid_ad:
+            return False, None, None
+        if any(not str(jid).isdigit() for jid in job.hold_jid):
+            return False, None, None  # holds on job names cannot be followed locally
+        if job_slots(job) > self.max_slots or (self.max_mem is not None and job_mem(job) > self.max_mem):
+            return False, None, None
+
+        runtime = get_runtime(self.estimates, job, self.default_runtime)
+        if runtime is None or (self.max_runtime is not None and runtime > self.max_runtime):
+            return False, None, None
+
+        local = self.backlog / self.workers + runtime * self.slowdown
+        cluster = self.expected_wait() + runtime
+        return local < cluster, local, cluster
+
+    def submit(self, commandline, job=None):
+        if job is not None and self.route(job)[0]:
+            return self._submit_local(job)
+        return self._submit_cluster(commandline, job)
+
+    def _submit_local(self, job):
+        runtime = get_runtime(self.estimates, job, self.default_runtime)
+        with self._lock:
+            job_id = self.next_id
+            self.next_id += 1
+            local = LocalJob(job_id, job, runtime)
+            self.local[job_id] = local
+            self.backlog += runtime
+        self._monitor().set_state(job_id, PENDING)
+        self._start_workers()
+        self._queue.put(local)
+        return "{}\n".format(job_id)
+
+    def _submit_cluster(self, commandline, job):
+        """Submit to the cluster, holding it with `-h` while local jobs it waits for are unfinished."""
+        hold_jid = _option_value(commandline, "-hold_jid")
+        hold_jid = hold_jid.split(',') if hold_jid else []
+        with self._lock:
+            waits = [self.local[int(jid)] for jid in hold_jid if jid.isdigit() and int(jid) in self.local]
+        if not waits:
+            return self.inner.submit(commandline, job)
+
+        commandline = list(commandline)
+        i = commandline.index("-hold_jid")
+        rest = [jid for jid in hold_jid if not (jid.isdigit() and int(jid) in self.local)]
+        if rest:
+            commandline[i+1] = ','.join(map(str, rest))
+        else:
+            del commandline[i:i+2]
+        unfinished = [local for local in waits if not local.done.is_set()]
+        if unfinished:
+            commandline.insert(1, "-h")
+
+        stdout = self.inner.submit(commandline, job)
+        if unfinished:
+            job_id = int(stdout.strip().split('.')[0])
+            with self._lock:
+                unfinished = [local for local in unfinished if not local.done.is_set()]
+                if unfinished:
+                    self._held.append((job_id, unfinished))
+            if not unfinished:
+                self.inner.release([job_id])
+        return stdout
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            local = self._queue.get()
+            try:
+                self._run(local)
+            finally:
+                self._queue.task_done()
+
+    def _wait_cluster(self, job_ids):
+        while job_ids:
+            try:
+                states = self.inner.status(job_ids)
+            except (subprocess.CalledProcessError, OSError, ET.ParseError):
+                states = None  # qmaster is busy or unreachable; ask again next interval
+            if states is not None:
+                job_ids = sorted(set(job_id for (job_id, _), state in states.items() if state not in FINISHED))
+                if not job_ids:
+                    return
+            self.sleep(self.interval)
+
+    def _run(self, local):
+        for jid in local.holds:
+            upstream = self.local.get(jid)
+            if upstream is not None:
+                upstream.done.wait()
+        self._wait_cluster([jid for jid in local.holds if jid not in self.local])
+
+        if local.state is None:  # deleted while waiting
+            self._finish(local, None)
+            return
+        local.state = RUNNING
+        self._monitor().set_state(local.job_id, RUNNING)
+        local.exit_status = local.run()
+        self._finish(local, DONE if local.exit_status == 0 else FAILED)
+
+    def _finish(self, local, state):
+        if state is not None:
+            local.state = state
+            self._monitor().set_state(local.job_id, state)
+        with self._lock:
+            self.backlog = max(0.0, self.backlog - local.runtime)
+            local.done.set()
+            released = [job_id for job_id, waits in self._held if all(w.done.is_set() for w in waits)]
+            self._held = [(job_id, waits) for job_id, waits in self._held if job_id not in released]
+        if released:
+            self.inner.release(released)
+
+    def join(self):
+        """Wait until every local job has finished."""
+        self._queue.join()
+
+    def status(self, job_ids=None):
+        with self._lock:
+            local_ids = set(self.local) if job_ids is None else set(job_ids) & set(self.local)
+            states = dict(((job_id, None), self.local[job_id].state) for job_id in local_ids
+                          if self.local[job_id].state is not None)
+        if job_ids is None:
+            states.update(self.inner.status())
+        else:
+            cluster_ids = [job_id for job_id in job_ids if job_id not in local_ids]
+            if cluster_ids:
+                states.update(self.inner.status(cluster_ids))
+        return states
+
+    def delete(self, job_ids):
+        """Delete jobs; local jobs which have not started yet are skipped, running ones are left to finish."""
+        cluster_ids = []
+        for job_id in job_ids:
+            local = self.local.get(job_id)
+            if local is None:
+                cluster_ids.append(job_id)
+            elif local.state == PENDING:
+                local.state = None
+        if cluster_ids:
+            self.inner.delete(cluster_ids)
+
+    def release(self, job_ids):
+        return self.inner.release([job_id for job_id in job_ids if job_id not in self.local])
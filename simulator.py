@@ -0,0 +1,293 @@
+import re
+import sys
+import heapq
+from collections import deque
+
+from submitter import JobGraph
+from critical import get_runtime
+from monitor import parse_tasks
+
+UNITS = {'': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+
+def parse_mem(value):
+    """Convert a GE memory specifier such as "4G" or "512M" into bytes."""
+    if value is None:
+        return 0
+    if isinstance(value, (int, long, float)):
+        return int(value)
+    m = re.match(r"^\s*([\d.]+)\s*([KMGT]?)", str(value).upper())
+    if m is None:
+        raise ValueError("Invalid memory specifier: {}".format(value))
+    return int(float(m.group(1)) * UNITS[m.group(2)])
+
+
+def job_slots(job):
+    for values in job.parallel_env.values():
+        for value in values if isinstance(values, (list, tuple)) else [values]:
+            m = re.match(r"^\d+", str(value))
+            if m:
+                return int(m.group(0))
+    return 1
+
+
+def job_mem(job):
+    for key in ("s_vmem", "mem_req", "h_vmem"):
+        if key in job.resource:
+            return parse_mem(job.resource[key]) * job_slots(job)
+    return 0
+
+
+def job_ntasks(job):
+    ntasks = getattr(job, "ntasks", None)
+    if ntasks:
+        return ntasks
+    if job.array:
+        return len(parse_tasks(job.array))
+    return 1
+
+
+class Cluster(object):
+    """Cluster model: `hosts` identical hosts with `slots` and `mem` each.
+
+    `max_running` limits the number of running tasks of the user, as a queue limit would.
+    """
+
+    def __init__(self, hosts=1, slots=1, mem=None, max_running=None):
+        self.hosts = hosts
+        self.slots = slots
+        self.mem = parse_mem(mem) if mem is not None else None
+        self.max_running = max_running
+
+    @property
+    def total_slots(self):
+        return self.hosts * self.slots
+
+
+class Stage(object):
+    def __init__(self, job, ntasks, runtime):
+        self.job = job
+        self.name = job.name
+        self.ntasks = ntasks
+        self.runtime = runtime
+        self.released = None
+        self.start = None
+        self.end = None
+        self.wait = 0.0
+
+    @property
+    def span(self):
+        return self.end - self.released
+
+
+class SimulationResult(object):
+    def __init__(self, cluster, stages, utilisation, critical_chain):
+        self.cluster = cluster
+        self.stages = stages
+        self.utilisation = utilisation
+        self.critical_chain = critical_chain
+        self.makespan = max([stage.end for stage in stages] or [0])
+
+    @property
+    def mean_utilisation(self):
+        busy = 0.0
+        for (t0, slots), (t1, _) in zip(self.utilisation, self.utilisation[1:]):
+            busy += slots * (t1 - t0)
+        total = self.cluster.total_slots * self.makespan
+        return busy / total if total else 0.0
+
+    @property
+    def bottlenecks(self):
+        """Stages on the simulated critical chain, longest first."""
+        return sorted(self.critical_chain, key=lambda stage: stage.span, reverse=True)
+
+    def report(self, out=sys.stdout, top=5):
+        out.write("Predicted makespan: {:.0f}s\n".format(self.makespan))
+        out.write("Mean slot utilisation: {:.1%}\n".format(self.mean_utilisation))
+        out.write("Bottleneck stages:\n")
+        for stage in self.bottlenecks[:top]:
+            out.write("  {}\t{} tasks\tspan {:.0f}s\tqueued {:.0f} task-s\n".format(
+                stage.name, stage.ntasks, stage.span, stage.wait
+            ))
+
+
+def simulate(pipeline, estimates=None, cluster=None, default=1.0):
+    """Replay a pipeline on a cluster model and return a `SimulationResult`.
+
+    Every task runs for its job's runtime estimate. Tasks are started in
+    priority and submission order on the first host with enough free slots and memory.
+    `-hold_jid` releases a job when all upstream tasks are done;
+    `-hold_jid_ad` releases task i when upstream task i is done.
+    """
+    cluster = Cluster() if cluster is None else cluster
+    graph = JobGraph.from_pipeline(pipeline)
+    jobs = graph.nodes
+    index = dict((job, i) for i, job in enumerate(jobs))
+
+    stages = [Stage(job, job_ntasks(job), get_runtime(estimates, job, default)) for job in jobs]
+    slots = [job_slots(job) for job in jobs]
+    mem = [job_mem(job) for job in jobs]
+    priority = [int(job.priority or 0) for job in jobs]
+    limit = [int(job.max_running) if job.max_running else None for job in jobs]
+
+    # a join's entry holds how many of its jobs are unfinished and which jobs wait for it
+    joins = dict((join, [len(graph.deps[join]), []]) for join in graph.joins)
+    whole_waiting = [0] * len(jobs)
+    ad_waiting = [None] * len(jobs)
+    whole_dependents = [[] for _ in jobs]
+    ad_dependents = [[] for _ in jobs]
+    for join in graph.joins:
+        for upstream, _ in graph.deps[join]:
+            whole_dependents[index[upstream]].append(join)
+    for i, job in enumerate(jobs):
+        for upstream, as_array in graph.deps[job]:
+            if upstream in joins:
+                whole_waiting[i] += 1
+                joins[upstream][1].append(i)
+                continue
+            u = index[upstream]
+            if as_array:
+                if ad_waiting[i] is None:
+                    ad_waiting[i] = [0] * stages[i].ntasks
+                for t in xrange(min(stages[i].ntasks, stages[u].ntasks)):
+                    ad_waiting[i][t] += 1
+                ad_dependents[u].append(i)
+            else:
+                whole_waiting[i] += 1
+                whole_dependents[u].append(i)
+
+    for job in jobs:
+        i = index[job]
+        if slots[i] > cluster.slots or (cluster.mem is not None and mem[i] > cluster.mem):
+            raise ValueError("Job does not fit on any host: {}".format(job.name))
+
+    free_slots = [cluster.slots] * cluster.hosts
+    free_mem = [cluster.mem] * cluster.hosts
+    running = [0] * len(jobs)
+    done = [0] * len(jobs)
+    total_running = [0]
+    ready = []
+    ready_tasks = [deque() for _ in jobs]
+    queued = [False] * len(jobs)
+    events = []
+    utilisation = [(0.0, 0)]
+    busy = [0]
+
+    def release(i, t, now):
+        if stages[i].released is None:
+            stages[i].released = now
+        ready_tasks[i].append((t, now))
+        if not queued[i]:
+            queued[i] = True
+            heapq.heappush(ready, (-priority[i], i))
+
+    def find_host(i):
+        for h in xrange(cluster.hosts):
+            if free_slots[h] >= slots[i] and (free_mem[h] is None or free_mem[h] >= mem[i]):
+                return h
+        return None
+
+    def dispatch(now):
+        deferred = []
+        while ready and busy[0] < cluster.total_slots:
+            if cluster.max_running is not None and total_running[0] >= cluster.max_running:
+                break
+            item = heapq.heappop(ready)
+            i = item[1]
+            tasks = ready_tasks[i]
+            while tasks:
+                if limit[i] is not None and running[i] >= limit[i]:
+                    break
+                if cluster.max_running is not None and total_running[0] >= cluster.max_running:
+                    break
+                h = find_host(i)
+                if h is None:
+                    break
+
+                t, released = tasks.popleft()
+                free_slots[h] -= slots[i]
+                if free_mem[h] is not None:
+                    free_mem[h] -= mem[i]
+                running[i] += 1
+                total_running[0] += 1
+                busy[0] += slots[i]
+                stage = stages[i]
+                if stage.start is None:
+                    stage.start = now
+                stage.wait += now - released
+                heapq.heappush(events, (now + stage.runtime, i, t, h))
+
+            if tasks:
+                deferred.append(item)
+            else:
+                queued[i] = False
+
+        for item in deferred:
+            heapq.heappush(ready, item)
+
+    def finish(i, t, h, now):
+        free_slots[h] += slots[i]
+        if free_mem[h] is not None:
+            free_mem[h] += mem[i]
+        running[i] -= 1
+        total_running[0] -= 1
+        busy[0] -= slots[i]
+        done[i] += 1
+
+        for d in ad_dependents[i]:
+            if t < stages[d].ntasks:
+                ad_waiting[d][t] -= 1
+                if ad_waiting[d][t] == 0 and whole_waiting[d] == 0:
+                    release(d, t, now)
+
+        if done[i] == stages[i].ntasks:
+            stages[i].end = now
+            for d in whole_dependents[i]:
+                satisfy(d, now)
+
+    def satisfy(d, now):
+        if d in joins:
+            joins[d][0] -= 1
+            if joins[d][0] == 0:
+                for j in joins[d][1]:
+                    satisfy(j, now)
+            return
+        whole_waiting[d] -= 1
+        if whole_waiting[d] == 0:
+            release_job(d, now)
+
+    def release_job(i, now):
+        if stages[i].ntasks == 0:
+            stages[i].released = stages[i].start = stages[i].end = now
+            return
+        for t in xrange(stages[i].ntasks):
+            if ad_waiting[i] is None or ad_waiting[i][t] == 0:
+                release(i, t, now)
+
+    for i in xrange(len(jobs)):
+        if whole_waiting[i] == 0:
+            release_job(i, 0.0)
+
+    now = 0.0
+    dispatch(now)
+    utilisation[0] = (now, busy[0])
+    while events:
+        now = events[0][0]
+        while events and events[0][0] == now:
+            _, i, t, h = heapq.heappop(events)
+            finish(i, t, h, now)
+        dispatch(now)
+        utilisation.append((now, busy[0]))
+
+    unfinished = [stage.name for stage in stages if stage.end is None]
+    if unfinished:
+        raise ValueError("Jobs never became runnable: {}".format(', '.join(unfinished)))
+
+    chain = []
+    stage = max(stages, key=lambda s: s.end) if stages else None
+    while stage is not None:
+        chain.append(stage)
+        upstreams = [stages[index[upstream]] for upstream, _ in graph.expand(stage.job)]
+        stage = max(upstreams, key=lambda s: s.end) if upstreams else None
+
+    return SimulationResult(cluster, stages, utilisation, chain)
@@ -0,0 +1,345 @@
+import sys
+import copy
+import time
+import heapq
+import Queue
+from multiprocessing.pool import ThreadPool
+
+from resolver import check_commands
+from journal import REUSE, SKIP, SUBMITTED
+from monitor import get_monitor
+from cache import CACHED
+from events import emit, enabled, FLATTEN, HOLDS, REPORT, RUN
+
+# scheduling options a barrier takes from the job it holds back, so that site policies accept it
+BARRIER_OPTIONS = ("queue", "project_name", "account_string", "resource", "cwd", "working_dir")
+
+
+class Join(object):
+    """Virtual node of a JobGraph standing for all jobs of a stage.
+
+    The jobs of the next stage hold on the join instead of on each of
+    those jobs, so a series of parallel stages has as many edges as jobs
+    rather than their cross product. Joins are never submitted; their holds
+    are expanded by `JobGraph.expand` at submission.
+    """
+
+    __slots__ = ()
+    name = "join"
+
+
+class JobGraph(object):
+    """Leaf jobs of a pipeline in sequential submission order and their hold edges.
+
+    `order` lists the jobs and joins with every upstream before its dependents.
+    With `max_fanin`, no job holds on more than that many jobs with `-hold_jid`:
+    wider fan-ins go through a tree of barrier jobs made by `make_barrier`,
+    which is given the job the barriers hold back.
+    """
+
+    def __init__(self, max_fanin=None, make_barrier=None):
+        self.nodes = []
+        self.order = []
+        self.deps = {}
+        self.max_fanin = max_fanin
+        self.make_barrier = make_barrier
+        self.barriers = set()
+        self.joins = set()
+        self._seen = set()
+
+    def add(self, job):
+        if job in self._seen:
+            raise IOError("Job appears more than once in the pipeline: {}".format(job.name))
+        if job.job_id is not None:
+            raise IOError("This job has already been submitted as {}".format(job.job_id))
+        self._seen.add(job)
+        self.nodes.append(job)
+        self.order.append(job)
+        self.deps.setdefault(job, [])
+
+    def link(self, upstream, job, as_array=False):
+        self.deps.setdefault(job, []).append((upstream, as_array))
+
+    def link_all(self, upstreams, target, as_array=False):
+        entries = target._entries()
+        if not as_array:
+            upstreams = self._barrier_tree(upstreams, entries[0])
+            if len(upstreams) > 1 and len(entries) > 1:
+                join = Join()
+                self.joins.add(join)
+                self.order.append(join)
+                self.deps[join] = [(upstream, False) for upstream in upstreams]
+                upstreams = [join]
+        for entry in entries:
+            for upstream in upstreams:
+                self.link(upstream, entry, as_array)
+
+    def expand(self, job):
+        """The (upstream, as_array) pairs `job` holds on, with joins replaced by the jobs they stand for."""
+        pairs = []
+        for upstream, as_array in self.deps[job]:
+            if upstream in self.joins:
+                pairs.extend(self.expand(upstream))
+            else:
+                pairs.append((upstream, as_array))
+        return pairs
+
+    def _fanin(self, job):
+        return sum(self._fanin(upstream) if upstream in self.joins else 1
+                   for upstream, as_array in self.deps[job] if not as_array)
+
+    def decide_joins(self, job, decisions):
+        """Decide the joins `job` holds on once all their jobs are decided.
+
+        A join is REUSE if any of its jobs is reused (so holds on it remain), SKIP otherwise.
+        """
+        for upstream, _ in self.deps[job]:
+            if upstream in self.joins and upstream not in decisions:
+                self.decide_joins(upstream, decisions)
+                kinds = [decisions[u][0] for u, _ in self.deps[upstream] if u in decisions]
+                if len(kinds) == len(self.deps[upstream]):
+                    decisions[upstream] = (REUSE if REUSE in kinds else SKIP, None, None)
+
+    def _barrier_tree(self, upstreams, template):
+        """Return at most `max_fanin` jobs which finish only after all `upstreams`."""
+        if self.max_fanin is None:
+            return upstreams
+
+        level = list(upstreams)
+        while len(level) > self.max_fanin:
+            barriers = []
+            for i in xrange(0, len(level), self.max_fanin):
+                barrier = self.make_barrier(template)
+                self.barriers.add(barrier)
+                self.add(barrier)
+                for upstream in level[i:i+self.max_fanin]:
+                    self.link(upstream, barrier)
+                barriers.append(barrier)
+            level = barriers
+        return level
+
+    def _limit_fanin(self):
+        """Route the remaining over-wide `-hold_jid` fan-ins through barrier trees."""
+        if self.max_fanin is None:
+            return
+
+        order, self.order, self.nodes = self.order, [], []
+        for job in order:
+            if job not in self.joins:
+                if self._fanin(job) > self.max_fanin:
+                    pairs = self.expand(job)
+                    whole = [upstream for upstream, as_array in pairs if not as_array]
+                    self.deps[job] = ([(upstream, False) for upstream in self._barrier_tree(whole, job)] +
+                                      [(upstream, True) for upstream, as_array in pairs if as_array])
+                self.nodes.append(job)
+            self.order.append(job)
+
+    @classmethod
+    def from_pipeline(cls, pipeline, max_fanin=None, make_barrier=None):
+        graph = cls(max_fanin, make_barrier)
+        pipeline._flatten(graph)
+        graph._limit_fanin()
+        return graph
+
+
+class Submitter(object):
+    """Submit a pipeline, running independent qsub calls in a bounded worker pool.
+
+    A job is submitted only after every job it holds on has got its ID.
+    Console lines are written in the same order as sequential submission.
+    Fan-ins wider than `max_fanin` are routed through barrier jobs running `BARRIER_COMMAND`.
+    With a `journal`, jobs still alive or finished from an earlier run are not submitted again.
+    With a `cache`, cacheable jobs whose outputs are already stored are not submitted at all.
+    """
+
+    BARRIER_COMMAND = "true"
+    BARRIER_NAME = "barrier"
+
+    def __init__(self, workers=1, backend=None, max_fanin=None, journal=None, cache=None):
+        self.workers = max(1, workers)
+        self.backend = backend
+        self.max_fanin = max_fanin
+        self.journal = journal
+        self.cache = cache
+        self.decided = {}
+        self.keys = {}
+
+    def make_barrier(self, template):
+        """A job running `BARRIER_COMMAND` with the queue, project, account, resources and directory of `template`."""
+        from piperunner import GEJob
+        opts = dict((name, copy.deepcopy(template._opts[name])) for name in BARRIER_OPTIONS if name in template._opts)
+        return GEJob(self.BARRIER_COMMAND, binary=True, name=self.BARRIER_NAME,
+                     stdout="/dev/null", stderr="/dev/null", **opts)
+
+    @staticmethod
+    def _attach_holds(graph, job):
+        start = time.time() if enabled(HOLDS) else None
+        pairs = graph.expand(job)
+        for upstream, as_array in pairs:
+            if as_array:
+                job.append_hold_jid_ad(upstream.job_id)
+            else:
+                job.append_hold_jid(upstream.job_id)
+        if start is not None:
+            emit(HOLDS, name=job.name, holds=len(pairs), duration=time.time() - start)
+
+    def _fetch_cached(self, graph, decisions):
+        """Decide CACHED for cacheable jobs found in the cache, once nothing upstream is submitted."""
+        for job in graph.nodes:
+            graph.decide_joins(job, decisions)
+            upstreams = [upstream for upstream, _ in graph.deps[job]]
+            if any(decisions.get(upstream, (REUSE,))[0] == REUSE for upstream in upstreams):
+                continue
+
+            if job in decisions:
+                if decisions[job][0] == SKIP and job.cacheable:
+                    self.cache.store(job)  # finished in an earlier run
+            elif job in graph.barriers:
+                decisions[job] = (SKIP, None, None)
+            elif job.cacheable and self.cache.fetch(job):
+                decisions[job] = (CACHED, None, None)
+
+    def _apply_decisions(self, graph):
+        decisions = {}
+        if self.journal is not None:
+            decisions, self.keys = self.journal.plan(graph, graph.barriers)
+        if self.cache is not None:
+            self._fetch_cached(graph, decisions)
+
+        for job, (status, job_id, array) in decisions.items():
+            if job in graph.joins:
+                continue
+            if job_id is not None:
+                job.job_id = job_id
+                job.array = array
+            self.decided[job] = status
+
+        # finished upstream jobs need no hold
+        for job in graph.order:
+            graph.deps[job] = [(upstream, as_array) for upstream, as_array in graph.deps[job]
+                               if decisions.get(upstream, (REUSE,))[0] == REUSE]
+
+    def _report(self, job):
+        status = self.decided.get(job, "SUBMITTED")
+        if job not in self.decided and job in self.keys:
+            self.journal.record(self.keys[job], job, SUBMITTED)
+        if enabled(REPORT):
+            emit(REPORT, name=job.name, job_id=job.job_id, status=status, line=job._format_submitted(status))
+
+    def submit(self, pipeline):
+        start = time.time()
+        graph = JobGraph.from_pipeline(pipeline, self.max_fanin, self.make_barrier)
+        emit(FLATTEN, nodes=len(graph.nodes), barriers=len(graph.barriers), duration=time.time() - start)
+        if self.cache is not None:
+            self.cache.collect()  # outputs of jobs from earlier runs which have succeeded since
+        if self.journal is not None or self.cache is not None:
+            self._apply_decisions(graph)
+        check_commands(set(command for job in graph.nodes if job not in self.decided for command in job._commands()))
+        if self.cache is not None:
+            for job in graph.nodes:
+                if job not in self.decided and job.cacheable:
+                    self.cache.release(job)
+        if self.workers == 1:
+            self._submit_sequential(graph)
+        else:
+            self._submit_concurrent(graph)
+        emit(RUN, nodes=len(graph.nodes), submitted=len(graph.nodes) - len(self.decided),
+             workers=self.workers, duration=time.time() - start)
+
+        if self.cache is not None:
+            monitor = get_monitor()
+            for job in graph.nodes:
+                if job not in self.decided and job.cacheable:
+                    self.cache.submitted(job)
+                    self.cache.store_when_done(job, monitor)
+        return pipeline._result()
+
+    def _submit_sequential(self, graph):
+        for job in graph.nodes:
+            if job not in self.decided:
+                self._attach_holds(graph, job)
+                job._qsub(self.backend)
+            self._report(job)
+
+    def _submit_concurrent(self, graph):
+        nodes = graph.nodes
+        order = graph.order
+        index = dict((job, i) for i, job in enumerate(order))
+        done = [job in self.decided for job in order]
+        waiting = [0] * len(order)
+        dependents = [[] for _ in order]
+        for i, job in enumerate(order):
+            for upstream, _ in graph.deps[job]:
+                if not done[index[upstream]]:
+                    waiting[i] += 1
+                    dependents[index[upstream]].append(i)
+
+        ready = []
+        finished = Queue.Queue()
+        inflight = 0
+        emitted = 0
+        error = None
+
+        def complete(i):
+            """Mark `i` done and queue the jobs it releases; joins complete as soon as they are released."""
+            stack = [i]
+            while stack:
+                i = stack.pop()
+                done[i] = True
+                for j in dependents[i]:
+                    waiting[j] -= 1
+                    if waiting[j] == 0:
+                        if order[j] in graph.joins:
+                            stack.append(j)
+                        else:
+                            heapq.heappush(ready, j)
+
+        for i in [i for i, n in enumerate(waiting) if n == 0 and not done[i]]:
+            if order[i] in graph.joins:
+                complete(i)
+            else:
+                heapq.heappush(ready, i)
+
+        def run(i):
+            try:
+                order[i]._qsub(self.backend)
+                finished.put((i, None))
+            except BaseException:
+                finished.put((i, sys.exc_info()))
+
+        pool = ThreadPool(self.workers)
+        try:
+            while ready or inflight:
+                while ready and error is None and inflight < self.workers:
+                    i = heapq.heappop(ready)
+                    self._attach_holds(graph, order[i])
+                    pool.apply_async(run, (i,))
+                    inflight += 1
+                if not inflight:
+                    break
+
+                i, exc_info = finished.get()
+                inflight -= 1
+                if exc_info is not None:
+                    if error is None:
+                        error = exc_info
+                    continue
+
+                complete(i)
+
+                while emitted < len(nodes) and done[index[nodes[emitted]]]:
+                    self._report(nodes[emitted])
+                    emitted += 1
+        finally:
+            pool.close()
+            pool.join()
+
+        while error is None and emitted < len(nodes):
+            self._report(nodes[emitted])
+            emitted += 1
+
+        if error is not None:
+            for job in nodes[emitted:]:
+                if done[index[job]]:
+                    self._report(job)
+            raise error[0], error[1], error[2]
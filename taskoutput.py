@@ -0,0 +1,47 @@
+from os import path
+
+from argtable import OutputIndex, chunk_path
+
+
+class TaskOutput(object):
+    """Reader of the stdout/stderr captured from a GEArrayJob submitted with `capture=True`.
+
+    `get(row)` reads one row's output with one index lookup and one seek;
+    `__iter__` streams all rows which have run in row order.
+    """
+
+    def __init__(self, job):
+        if not job.output:
+            raise ValueError("{} was not submitted with capture=True".format(job.name))
+        self.directory = job.output
+        self.combinations = job.combinations
+        self.index = OutputIndex(path.join(self.directory, "index"))
+        self._chunks = {}
+
+    def _chunk(self, chunk):
+        if chunk not in self._chunks:
+            self._chunks[chunk] = open(chunk_path(self.directory, chunk), "rb")
+        return self._chunks[chunk]
+
+    def _read(self, entry):
+        chunk, offset, stdout_length, stderr_length = entry
+        f = self._chunk(chunk)
+        f.seek(offset)
+        return f.read(stdout_length), f.read(stderr_length)
+
+    def get(self, row):
+        """Return (stdout, stderr) of `row`, or None if it has not run."""
+        entry = self.index.get(row)
+        return None if entry is None else self._read(entry)
+
+    def __iter__(self):
+        """Yield (row, stdout, stderr) for every row which has run."""
+        for row, entry in enumerate(self.index.read(self.combinations)):
+            if entry is not None:
+                stdout, stderr = self._read(entry)
+                yield row, stdout, stderr
+
+    def close(self):
+        for f in self._chunks.values():
+            f.close()
+        self._chunks.clear()
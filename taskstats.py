@@ -0,0 +1,57 @@
+from argtable import ArgTable, TaskStats
+from events import percentile
+
+METRICS = ("wall", "utime", "stime", "maxrss")
+
+
+def load_stats(job):
+    """List (row, arguments, stats) for every row of a profiled GEArrayJob which has run."""
+    if not job.stats:
+        raise ValueError("{} was not submitted with profile=True".format(job.name))
+    table = ArgTable(job.table)
+    try:
+        return [(row, table[row], stats) for row, stats in enumerate(TaskStats(job.stats).read(len(table)))
+                if stats is not None]
+    finally:
+        table.close()
+
+
+def summarise(job, metrics=METRICS):
+    """Return {metric: dict(count, min, p50, p99, max)} over the rows of `job` which have run."""
+    records = [stats for _, _, stats in load_stats(job)]
+    summary = {}
+    for metric in metrics:
+        values = sorted(stats[metric] for stats in records)
+        if values:
+            summary[metric] = dict(count=len(values), min=values[0], p50=percentile(values, 50),
+                                   p99=percentile(values, 99), max=values[-1])
+    return summary
+
+
+def outliers(job, metric="wall", axis=0, factor=2.0):
+    """Find argument values of `axis` whose rows are unusually expensive.
+
+    Rows are grouped by their value on `axis` (0 for arg1). Returns
+    [(value, rows, median)] for groups whose median `metric` exceeds
+    `factor` times the median over all rows, most expensive first.
+    """
+    records = load_stats(job)
+    overall = percentile(sorted(stats[metric] for _, _, stats in records), 50)
+    if not overall:
+        return []
+
+    groups = {}
+    for _, args, stats in records:
+        groups.setdefault(args[axis], []).append(stats[metric])
+
+    found = []
+    for value, values in groups.items():
+        median = percentile(sorted(values), 50)
+        if median > factor * overall:
+            found.append((value, len(values), median))
+    return sorted(found, key=lambda item: -item[2])
+
+
+def failures(job):
+    """List (row, arguments, stats) of the rows of `job` which exited with a non-zero status."""
+    return [record for record in load_stats(job) if record[2]["exit_status"] != 0]
@@ -0,0 +1,79 @@
+import shutil
+import itertools
+import tempfile
+import unittest
+
+from piperunner import GEArrayJob
+from argtable import ArgTable, write_table, PRODUCT
+
+
+class ArgTableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_zip_rows(self):
+        table = ArgTable(write_table([["a", "b c", ''], [1, 2, 3, 4]], self.directory))
+        try:
+            self.assertEqual(len(table), 3)
+            self.assertEqual(table[1], ("b c", "2"))
+            self.assertEqual(table[-1], ('', "3"))
+            self.assertEqual(table[0:3:2], [("a", "1"), ('', "3")])
+            self.assertRaises(IndexError, table.__getitem__, 3)
+        finally:
+            table.close()
+
+    def test_product_rows(self):
+        axes = [["a", "b"], ["x", "y", "z"], ["1", "2"]]
+        table = ArgTable(write_table(axes, self.directory, mode=PRODUCT))
+        try:
+            self.assertEqual(len(table), 12)
+            self.assertEqual(table[:], list(itertools.product(*axes)))
+        finally:
+            table.close()
+
+    def test_not_a_table(self):
+        filename = write_table([], self.directory)
+        with open(filename, "wb") as f:
+            f.write("#!/bin/sh\n" + '\0' * 32)
+        self.assertRaises(IOError, ArgTable, filename)
+
+
+class ArrayJobTableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_arguments_kept_out_of_commandline(self):
+        values = ["sample{}".format(i) for i in xrange(10000)]
+        job = GEArrayJob("echo", args=["{1}"], arg1=values, table_dir=self.directory)
+        job._build_command()
+        self.assertEqual(job.array, "1-10000")
+        self.assertNotIn("sample9999", job.commandline)
+        self.assertLess(len(job.commandline), 50)
+
+        table = ArgTable(job.table)
+        try:
+            self.assertEqual(table[9999], ("sample9999",))
+        finally:
+            table.close()
+
+    def test_combinations_not_expanded(self):
+        axes = [range(1000), range(1000), range(10)]
+        job = GEArrayJob("echo", args=["{1}", "{2}", "{3}"], make_combination=True, table_dir=self.directory,
+                         arg1=axes[0], arg2=axes[1], arg3=axes[2])
+        self.assertEqual(job.array, "1-10000000")
+
+        table = ArgTable(job.table)
+        try:
+            self.assertEqual(table[1234567], ("123", "456", "7"))
+        finally:
+            table.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
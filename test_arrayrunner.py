@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from piperunner import GEJob, GEArrayJob
+from argtable import TaskStatus, task_slice
+
+
+def run_task(job, task, slots=1):
+    env = dict(os.environ, SGE_TASK_ID=str(task), SGE_TASK_LAST=str(job.ntasks), NSLOTS=str(slots))
+    return subprocess.call([sys.executable] + job.args, env=env)
+
+
+class PackingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lazy_check = GEJob.lazy_check
+        GEJob.lazy_check = True  # the command is taken from the table
+
+    def tearDown(self):
+        GEJob.lazy_check = self.lazy_check
+        shutil.rmtree(self.directory)
+
+    def test_task_slices_cover_rows(self):
+        for length, ntasks in ((7, 3), (10, 10), (3, 5), (100000, 7)):
+            slices = [task_slice(number, ntasks, length) for number in xrange(ntasks)]
+            self.assertEqual(slices[0][0], 0)
+            self.assertEqual(slices[-1][1], length)
+            self.assertTrue(all(stop == start for (_, stop), (start, _) in zip(slices, slices[1:])))
+
+    def test_rows_packed_into_tasks(self):
+        job = GEArrayJob("{1}", args=["{2}"], arg1=["true"] * 6 + ["false"], arg2=range(7),
+                         per_task=3, table_dir=self.directory)
+        self.assertEqual((job.ntasks, job.array), (3, "1-3"))
+        self.assertEqual([run_task(job, task) for task in (1, 2, 3)], [0, 0, 1])
+        self.assertEqual(TaskStatus(job.status).read(7), [0] * 6 + [1])
+
+    def test_rows_run_in_slot_pool(self):
+        job = GEArrayJob("sleep", args=["{1}"], arg1=["0.3"] * 4, per_task=4, table_dir=self.directory)
+        start = time.time()
+        self.assertEqual(run_task(job, 1, slots=4), 0)
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(TaskStatus(job.status).read(4), [0] * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
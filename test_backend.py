@@ -0,0 +1,60 @@
+import time
+import unittest
+import subprocess
+
+import events
+from piperunner import GEJob, GESeriesJob, GEParallelJob
+from backend import FakeBackend, QsubBackend
+from monitor import PENDING, DONE
+
+
+class FakeBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+
+    def test_holds_recorded(self):
+        first = GEJob("ls", binary=True, name="first")
+        second = GEJob("ls", binary=True, name="second")
+        last = GEJob("ls", binary=True, name="last")
+        GESeriesJob([GEParallelJob([first, second]), last]).submit(backend=self.backend)
+
+        self.assertEqual(self.backend.order, [1, 2, 3])
+        self.assertEqual(sorted(self.backend.jobs[3]["hold_jid"]), ['1', '2'])
+        self.assertEqual(self.backend.jobs[1]["commandline"][0], "qsub")
+
+    def test_array_output(self):
+        self.assertEqual(self.backend.submit(["qsub", "-t", "1-10", "ls"]), "1.1-10:1\n")
+        self.assertEqual(self.backend.submit(["qsub", "-t", "1-10:2", "ls"]), "2.1-10:2\n")
+        self.assertEqual(len(self.backend.status([1])), 10)
+
+    def test_status(self):
+        for _ in range(3):
+            self.backend.submit(["qsub", "-N", "a", "ls"])
+        self.backend.finish(1)
+        self.backend.delete([2])
+        self.assertEqual(self.backend.status(), {(1, None): DONE, (3, None): PENDING})
+
+    def test_find(self):
+        self.backend.submit(["qsub", "-N", "a", "ls"])
+        since = time.time()
+        self.backend.submit(["qsub", "-N", "a", "ls"])
+        self.backend.submit(["qsub", "-N", "b", "ls"])
+        self.assertEqual(self.backend.find("a", since), [2])
+
+
+class QsubBackendTest(unittest.TestCase):
+    def test_error_output(self):
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            QsubBackend().submit(["sh", "-c", "echo unable to contact qmaster >&2; exit 1"])
+        self.assertIn("unable to contact qmaster", context.exception.output)
+
+    def test_submit_output(self):
+        self.assertEqual(QsubBackend().submit(["echo", "12345"]), "12345\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import events
+import monitor
+from piperunner import GEJob, GESeriesJob, GEParallelJob
+from backend import FakeBackend
+from submitter import Submitter
+
+
+class BarrierTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.monitor = monitor.get_monitor()
+        monitor.set_monitor(monitor.GEMonitor(qstat=lambda: "<job_info/>", qacct=lambda job_id: ''))
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+        monitor.set_monitor(self.monitor)
+
+    def upstreams(self, job_id):
+        """IDs of the non-barrier jobs `job_id` waits for, through any barriers."""
+        found = set()
+        for jid in self.backend.jobs[job_id]["hold_jid"]:
+            upstream = self.backend.jobs[int(jid)]
+            if upstream["commandline"][-1] == Submitter.BARRIER_COMMAND:
+                found |= self.upstreams(int(jid))
+            else:
+                found.add(int(jid))
+        return found
+
+    def test_fanin_limited(self):
+        stage = [GEJob("ls", binary=True, name="stage{}".format(i)) for i in range(10)]
+        last = GEJob("ls", binary=True, name="last", queue="short.q", resource={"h_vmem": "1G"})
+        Submitter(backend=self.backend, max_fanin=3).submit(GESeriesJob([GEParallelJob(stage), last]))
+
+        barriers = [job_id for job_id, job in self.backend.jobs.items()
+                    if job["commandline"][-1] == Submitter.BARRIER_COMMAND]
+        self.assertEqual(len(barriers), 4 + 2)
+        self.assertTrue(all(len(job["hold_jid"]) <= 3 for job in self.backend.jobs.values()))
+        self.assertEqual(self.upstreams(last.job_id), set(job.job_id for job in stage))
+
+        commandline = self.backend.jobs[barriers[0]]["commandline"]
+        self.assertIn("short.q", commandline)
+        self.assertIn("h_vmem=1G", commandline)
+
+    def test_narrow_fanin_unchanged(self):
+        stage = [GEJob("ls", binary=True, name="stage{}".format(i)) for i in range(3)]
+        last = GEJob("ls", binary=True, name="last")
+        Submitter(backend=self.backend, max_fanin=3).submit(GESeriesJob([GEParallelJob(stage), last]))
+        self.assertEqual(len(self.backend.order), 4)
+        self.assertEqual(sorted(self.backend.jobs[last.job_id]["hold_jid"]), ['1', '2', '3'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+
+import events
+import monitor
+from piperunner import GEJob
+from backend import FakeBackend
+from submitter import Submitter
+from cache import GECache, CACHED
+from monitor import FAILED
+
+
+class ReportSink(events.Sink):
+    events = (events.REPORT,)
+
+    def __init__(self):
+        self.statuses = []
+
+    def __call__(self, event):
+        self.statuses.append(event["status"])
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = FakeBackend()
+        self.monitor = monitor.get_monitor()
+        fake = monitor.GEMonitor(qstat=lambda: "<job_info/>", qacct=lambda job_id: '')
+        monitor.set_monitor(fake)
+        self.cache = GECache(path.join(self.directory, "cache"), backend=self.backend, monitor=fake)
+        self.input = self.write("in.txt", "data\n")
+        self.output = path.join(self.directory, "out.txt")
+        self.sink = ReportSink()
+        events.remove_sink(events.console)
+        events.add_sink(self.sink)
+
+    def tearDown(self):
+        events.remove_sink(self.sink)
+        events.add_sink(events.console)
+        monitor.set_monitor(self.monitor)
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        filename = path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(content)
+        return filename
+
+    def job(self):
+        return GEJob("cp", args=[self.input, self.output], binary=True, name="copy",
+                     inputs=[self.input], outputs=[self.output], cacheable=True)
+
+    def run_job(self, state=None):
+        """Submit the job; unless `state` is None, write its output and finish it in that state."""
+        job = self.job()
+        Submitter(backend=self.backend, cache=self.cache).submit(job)
+        if state is not None:
+            shutil.copy(self.input, self.output)
+            self.backend.finish(job.job_id, state)
+        return job
+
+    def test_hit_after_success(self):
+        self.run_job(monitor.DONE)
+        self.assertEqual(self.cache.collect(), 1)
+        os.remove(self.output)
+        job = self.run_job()
+        self.assertIsNone(job.job_id)
+        self.assertEqual(self.backend.order, [1])
+        self.assertEqual(self.sink.statuses, ["SUBMITTED", CACHED])
+        with open(self.output) as f:
+            self.assertEqual(f.read(), "data\n")
+
+    def test_changed_input_missed(self):
+        self.run_job(monitor.DONE)
+        self.write("in.txt", "other\n")
+        self.run_job()
+        self.assertEqual(self.backend.order, [1, 2])
+
+    def test_input_changed_while_running(self):
+        self.run_job(monitor.DONE)
+        self.write("in.txt", "other\n")
+        self.assertEqual(self.cache.collect(), 0)
+        self.run_job()
+        self.assertEqual(self.backend.order, [1, 2])
+
+    def test_failed_job_not_stored(self):
+        self.run_job(FAILED)
+        self.run_job()
+        self.assertEqual(self.backend.order, [1, 2])
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_eviction(self):
+        self.cache.max_bytes = 0
+        self.run_job(monitor.DONE)
+        self.run_job()
+        self.assertEqual(self.cache.entries(), [])
+        self.assertEqual(self.backend.order, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
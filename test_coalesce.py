@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+import unittest
+
+import events
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob, GEDAGJob
+from argtable import ArgTable
+from backend import FakeBackend
+from coalesce import coalesce, coalesce_key
+
+
+def job(name, i, **kwargs):
+    return GEJob("echo", args=[name, str(i)], binary=True, cwd=True, shell=False, name=name, **kwargs)
+
+
+class CoalesceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+        shutil.rmtree(self.directory)
+
+    def test_parallel(self):
+        last = GEJob("ls", binary=True, name="last")
+        pipeline = coalesce(GESeriesJob([GEParallelJob([job("a", i) for i in range(3)]), last]),
+                            table_dir=self.directory)
+        array = pipeline.jobs[0].jobs[0]
+        self.assertEqual(type(array), GEArrayJob)
+        self.assertEqual([list(row) for row in ArgTable(array.table)], [["a", "0"], ["a", "1"], ["a", "2"]])
+
+        backend = FakeBackend()
+        pipeline.submit(backend=backend)
+        self.assertEqual(backend.order, [1, 2])
+        self.assertEqual(backend.jobs[2]["hold_jid"], ['1'])
+
+    def test_options_not_shared(self):
+        jobs = [job("a", i, resource={"s_vmem": "1G"}) for i in range(2)]
+        array = coalesce(GEParallelJob(jobs), table_dir=self.directory).jobs[0]
+        array.resource["s_vmem"] = "2G"
+        self.assertEqual(jobs[0].resource["s_vmem"], "1G")
+
+    def test_not_coalesced(self):
+        shell = [GEJob("echo", args=["$HOME", str(i)], binary=True, cwd=True, name="a") for i in range(3)]
+        cached = [job("a", i, inputs="in{}".format(i), outputs="out{}".format(i), cacheable=True) for i in range(3)]
+        outputs = [job("a", i, outputs="out{}".format(i)) for i in range(3)]
+        for jobs in (shell, cached, outputs):
+            self.assertEqual(set(map(coalesce_key, jobs)), set([None]))
+            self.assertEqual(coalesce(GEParallelJob(list(jobs)), table_dir=self.directory).jobs, jobs)
+
+    def test_dag_same_upstreams(self):
+        first = GEJob("ls", binary=True, name="first")
+        other = GEJob("pwd", binary=True, name="other")
+        dag = GEDAGJob()
+        for i in range(2):
+            dag.add(job("a", i), after=first)
+        dag.add(job("a", 2), after=other)
+        dag = coalesce(dag, table_dir=self.directory)
+        self.assertEqual(sorted(type(node).__name__ for node in dag.jobs), ["GEArrayJob", "GEJob", "GEJob", "GEJob"])
+
+
+if __name__ == "__main__":
+    unittest.main()
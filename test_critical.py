@@ -0,0 +1,42 @@
+import shutil
+import tempfile
+import unittest
+
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob
+from critical import assign_priorities
+
+
+def job(name, **kwargs):
+    return GEJob("ls", binary=True, name=name, **kwargs)
+
+
+class PriorityTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_slack_lowers_priority(self):
+        long, first, second = job("long"), job("first"), job("second", priority=-5)
+        pipeline = GEParallelJob([long, GESeriesJob([first, second])])
+        makespan, slack = assign_priorities(pipeline, {"long": 100, "first": 10, "second": 10}, out=None)
+
+        self.assertEqual(makespan, 100)
+        self.assertEqual((slack[long], slack[first]), (0, 80))
+        self.assertEqual((long.priority, first.priority), (0, -818))
+        self.assertEqual(second.priority, -5)  # set by the user
+
+        assign_priorities(pipeline, {"long": 100, "first": 10, "second": 10}, override=True, out=None)
+        self.assertEqual(second.priority, -818)
+
+    def test_array_throttled_within_slack(self):
+        long = job("long")
+        array = GEArrayJob("echo", args=["{1}"], arg1=range(10), name="array", table_dir=self.directory)
+        assign_priorities(GEParallelJob([long, array]), {"long": 100, "array": 10}, out=None)
+        self.assertEqual(array.max_running, 1)
+        self.assertEqual(long.max_running, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
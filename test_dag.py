@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+import unittest
+
+import events
+import monitor
+from piperunner import GEJob, GEArrayJob, GEDAGJob
+from backend import FakeBackend
+
+
+def job(name):
+    return GEJob("ls", binary=True, name=name)
+
+
+class DAGTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = FakeBackend()
+        self.monitor = monitor.get_monitor()
+        monitor.set_monitor(monitor.GEMonitor(qstat=lambda: "<job_info/>", qacct=lambda job_id: ''))
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+        monitor.set_monitor(self.monitor)
+        shutil.rmtree(self.directory)
+
+    def holds(self, job):
+        return sorted(int(jid) for jid in self.backend.jobs[job.job_id]["hold_jid"])
+
+    def test_not_series_parallel(self):
+        a, b, c, d = map(job, "abcd")
+        dag = GEDAGJob()
+        dag.add(c, after=[a, b])
+        dag.add(d, after=[b])
+        dag.submit(backend=self.backend)
+
+        self.assertEqual(self.holds(c), [a.job_id, b.job_id])
+        self.assertEqual(self.holds(d), [b.job_id])
+        self.assertEqual(self.holds(a) + self.holds(b), [])
+
+    def test_array_dependency(self):
+        first = GEArrayJob("echo", args=["{1}"], arg1=range(4), table_dir=self.directory, name="first")
+        second = GEArrayJob("echo", args=["{1}"], arg1=range(4), table_dir=self.directory, name="second")
+        last = job("last")
+        dag = GEDAGJob()
+        dag.add(second, after_array=[first])
+        dag.add(last, after=[first, second])
+        dag.submit(backend=self.backend)
+
+        self.assertEqual(self.backend.jobs[second.job_id]["hold_jid_ad"], [str(first.job_id)])
+        self.assertEqual(self.holds(last), [first.job_id, second.job_id])
+
+    def test_array_size_mismatch(self):
+        first = GEArrayJob("echo", args=["{1}"], arg1=range(4), table_dir=self.directory)
+        second = GEArrayJob("echo", args=["{1}"], arg1=range(5), table_dir=self.directory)
+        self.assertRaises(ValueError, GEDAGJob().add, second, after_array=[first])
+
+    def test_cycle(self):
+        a, b = job("a"), job("b")
+        dag = GEDAGJob()
+        dag.add(b, after=[a])
+        dag.add(a, after=[b])
+        self.assertRaises(ValueError, dag.submit, backend=self.backend)
+        self.assertEqual(self.backend.order, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
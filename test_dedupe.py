@@ -0,0 +1,54 @@
+import unittest
+from StringIO import StringIO
+
+import events
+import monitor
+from piperunner import GEJob, GESeriesJob, GEParallelJob
+from backend import FakeBackend
+from dedupe import merge_duplicates
+
+
+def job(command, name, **kwargs):
+    return GEJob(command, binary=True, name=name, **kwargs)
+
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.monitor = monitor.get_monitor()
+        monitor.set_monitor(monitor.GEMonitor(qstat=lambda: "<job_info/>", qacct=lambda job_id: ''))
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+        monitor.set_monitor(self.monitor)
+
+    def test_shared_step_merged(self):
+        first_prep, second_prep = job("ls", "prep", hold_jid="100"), job("ls", "prep", hold_jid="200")
+        first, second = job("pwd", "first"), job("pwd", "second", args=["-P"])
+        pipeline = GEParallelJob([GESeriesJob([first_prep, first]), GESeriesJob([second_prep, second])])
+
+        out = StringIO()
+        dag = merge_duplicates(pipeline, estimates={"prep": 10}, out=out)
+        self.assertEqual(out.getvalue(), "1 duplicate jobs merged: 1 fewer submissions, 1 fewer tasks, "
+                                         "10 slot-seconds of compute saved\n")
+        self.assertEqual(dag.jobs, [first_prep, first, second])
+
+        dag.submit(backend=self.backend)
+        self.assertEqual(len(self.backend.order), 3)
+        self.assertEqual(self.backend.jobs[first_prep.job_id]["hold_jid"], ["100", "200"])
+        for dependent in (first, second):
+            self.assertEqual(self.backend.jobs[dependent.job_id]["hold_jid"], [str(first_prep.job_id)])
+
+    def test_different_outputs_kept(self):
+        pipeline = GEParallelJob([job("ls", "a", outputs=["a.txt"]), job("ls", "a", outputs=["b.txt"])])
+        self.assertIs(merge_duplicates(pipeline, out=None), pipeline)
+
+    def test_cycle_avoided(self):
+        first, middle, again = job("ls", "step"), job("pwd", "middle"), job("ls", "step")
+        pipeline = GESeriesJob([first, middle, again])
+        self.assertIs(merge_duplicates(pipeline, out=None), pipeline)
+
+
+if __name__ == "__main__":
+    unittest.main()
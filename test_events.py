@@ -0,0 +1,66 @@
+import json
+import unittest
+from StringIO import StringIO
+
+import events
+import monitor
+from piperunner import GEJob, GESeriesJob
+from backend import FakeBackend
+
+
+class EventsTest(unittest.TestCase):
+    def setUp(self):
+        self.monitor = monitor.get_monitor()
+        monitor.set_monitor(monitor.GEMonitor(qstat=lambda: "<job_info/>", qacct=lambda job_id: ''))
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+        monitor.set_monitor(self.monitor)
+
+    def submit(self, *sinks):
+        for sink in sinks:
+            events.add_sink(sink)
+        try:
+            GESeriesJob([GEJob("ls", binary=True, name="first"), GEJob("ls", binary=True, name="second")]).submit(
+                backend=FakeBackend())
+        finally:
+            for sink in sinks:
+                events.remove_sink(sink)
+
+    def test_only_wanted_events_enabled(self):
+        self.assertFalse(events.enabled(events.QSUB))
+        sink = events.add_sink(events.JSONLinesSink(StringIO(), events=(events.QSUB,)))
+        try:
+            self.assertTrue(events.enabled(events.QSUB))
+            self.assertFalse(events.enabled(events.BUILD))
+        finally:
+            events.remove_sink(sink)
+        self.assertFalse(events.enabled(events.QSUB))
+
+    def test_json_lines(self):
+        out = StringIO()
+        self.submit(events.JSONLinesSink(out, events=(events.QSUB, events.REPORT, events.RUN)))
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([record["event"] for record in records], [events.QSUB, events.REPORT] * 2 + [events.RUN])
+        self.assertEqual([record["job_id"] for record in records if record["event"] == events.REPORT], [1, 2])
+        self.assertEqual((records[-1]["nodes"], records[-1]["submitted"]), (2, 2))
+
+    def test_summary(self):
+        out = StringIO()
+        sink = events.SummarySink(out)
+        self.submit(sink)
+        summary = sink.summary()
+        self.assertEqual(summary[events.QSUB]["count"], 2)
+        self.assertEqual(summary[events.FLATTEN]["count"], 1)
+        self.assertTrue(out.getvalue().startswith("construct"))
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(events.percentile(values, 50), 51)
+        self.assertEqual(events.percentile(values, 99), 100)
+        self.assertEqual(events.percentile([], 50), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from os import path
+
+import chainrunner
+from piperunner import GEJob, GESeriesJob, GEDAGJob
+from fusion import fusion_key, fuse, GEFusedJob
+
+
+def step(name, resource=None):
+    return GEJob("ls", binary=True, name=name, resource=resource)
+
+
+class FusionKeyTest(unittest.TestCase):
+    def test_read_options_ignored(self):
+        first, second = step("first"), step("second")
+        first.resource
+        first.var
+        self.assertEqual(fusion_key(first), fusion_key(second))
+
+    def test_scheduling_options_compared(self):
+        self.assertNotEqual(fusion_key(step("first", {"h_vmem": "4G"})), fusion_key(step("second")))
+        self.assertIsNone(fusion_key(GEJob("ls", binary=True, shell=True, array="1-2")))
+
+
+class FuseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_series(self):
+        jobs = [step("a"), step("b"), step("big", {"h_vmem": "4G"}), step("c"), step("d")]
+        jobs[1].resource
+        pipeline = fuse(GESeriesJob(jobs), spec_dir=self.directory)
+        self.assertEqual([job.name for job in pipeline.jobs], ["a+b", "big", "c+d"])
+        self.assertIsInstance(pipeline.jobs[0], GEFusedJob)
+
+    def test_dag_branch_not_fused(self):
+        a, b, c, d = map(step, "abcd")
+        dag = GEDAGJob()
+        dag.add(a)
+        dag.add(b, after=[a])
+        dag.add(c, after=[b])
+        dag.add(d, after=[b])
+        fused = fuse(dag, spec_dir=self.directory)
+        self.assertEqual([job.name for job in fused.jobs], ["a+b", "c", "d"])
+        self.assertEqual(fused.deps[fused.jobs[2]], [(fused.jobs[0], False)])
+
+
+class ChainRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_steps_with_own_output(self):
+        out = path.join(self.directory, "first.out")
+        steps = [dict(name="first", argv=["echo", "one"], shell=False, stdout=[out], stderr=None, join=False),
+                 dict(name="second", argv=["echo two >&2"], shell=True, stdout=[out], stderr=None, join=True)]
+        for spec in steps:
+            self.assertEqual(chainrunner.run_step(spec, cwd=self.directory), 0)
+        with open(out) as f:
+            self.assertEqual(f.read(), "one\ntwo\n")
+
+    def test_stops_at_failure(self):
+        spec = path.join(self.directory, "chain.json")
+        marker = path.join(self.directory, "ran")
+        with open(spec, 'w') as f:
+            json.dump([dict(name="fail", argv=["exit 3"], shell=True, stdout=None, stderr=None, join=False),
+                       dict(name="next", argv=["touch", marker], shell=False, stdout=None, stderr=None, join=False)], f)
+        self.assertEqual(subprocess.call([sys.executable, GEFusedJob.CHAINRUNNER, spec]), 3)
+        self.assertFalse(path.exists(marker))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import threading
+import unittest
+import subprocess
+
+from backend import FakeBackend
+from governor import GEGovernor
+
+
+class FlakyBackend(FakeBackend):
+    """FakeBackend whose qsub fails as listed in `failures`, with the job accepted by qmaster or not.
+
+    Once accepted, a submission waits for `returned` before qsub returns.
+    """
+
+    def __init__(self):
+        FakeBackend.__init__(self)
+        self.failures = []
+        self.accepted = threading.Event()
+        self.returned = threading.Event()
+        self.returned.set()
+
+    def submit(self, commandline, job=None):
+        accepted, error = self.failures.pop(0) if self.failures else (True, None)
+        if accepted:
+            FakeBackend.submit(self, commandline, job)
+            self.accepted.set()
+            self.returned.wait()
+        if error is not None:
+            raise subprocess.CalledProcessError(1, commandline, error)
+        return "{}\n".format(self.order[-1])
+
+
+class SubmitRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FlakyBackend()
+        self.governor = GEGovernor(self.backend, sleep=lambda seconds: None)
+
+    def test_timed_out_job_adopted(self):
+        self.backend.failures = [(True, "error: failed receiving gdi request response: timeout")]
+        self.assertEqual(self.governor.submit(["qsub", "-N", "a", "ls"]), "1\n")
+        self.assertEqual(self.backend.order, [1])
+        self.assertEqual(self.governor.inflight, 0)
+
+    def test_unsent_job_submitted_again(self):
+        self.backend.failures = [(False, "error: unable to contact qmaster")] * 2
+        self.assertEqual(self.governor.submit(["qsub", "-N", "a", "ls"]), "1\n")
+        self.assertEqual(self.backend.order, [1])
+
+    def test_known_job_not_adopted(self):
+        self.governor.submit(["qsub", "-N", "a", "ls"])
+        self.backend.failures = [(False, "timeout")] * (self.governor.retries + 1)
+        self.assertRaises(IOError, self.governor.submit, ["qsub", "-N", "a", "ls"])
+        self.assertEqual(self.governor.inflight, 0)
+
+    def test_sibling_in_flight_not_adopted(self):
+        self.backend.returned.clear()
+        sibling = threading.Thread(target=self.governor.submit, args=(["qsub", "-N", "a", "ls"],))
+        sibling.start()
+        self.backend.accepted.wait(5)
+
+        self.backend.failures = [(False, "timeout")]
+        try:
+            self.assertRaises(IOError, self.governor.submit, ["qsub", "-N", "a", "ls"])
+        finally:
+            self.backend.returned.set()
+            sibling.join()
+        self.assertEqual(self.backend.order, [1])
+        self.assertEqual(self.governor.inflight, 0)
+
+        # the failed submission may yet show up in the queue: no job of its name is adopted any more
+        self.backend.failures = [(True, "timeout")]
+        self.assertRaises(IOError, self.governor.submit, ["qsub", "-N", "a", "ls"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import math
+import shutil
+import tempfile
+import unittest
+from os import path
+
+from piperunner import GEJob, GESeriesJob
+from history import GEHistory, right_size, MB
+from simulator import job_slots
+
+FIXTURES = path.join(path.dirname(path.abspath(__file__)), "fixtures")
+
+
+def fixture(name):
+    with open(path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+class RightSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.history = GEHistory(path.join(self.directory, "accounting.jsonl"))
+        self.history.record_text("align", fixture("qacct_align.txt"))
+        self.history.record_text("merge", fixture("qacct_done.txt"))
+        self.history.record_text("sort", fixture("qacct_failed.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_suggest(self):
+        # 80s of CPU in 10s on the larger run, 2048M peak
+        total_mem = int(math.ceil(2048 * MB * 1.2))
+        self.assertEqual(self.history.suggest(GEJob("ls", binary=True, name="align")),
+                         dict(mem=-(-total_mem // 8), total_mem=total_mem, slot=8, runtime=12, samples=2))
+
+    def test_slot_tolerance(self):
+        # 10.4s of CPU in 10s asks for no second slot
+        self.assertEqual(self.history.suggest(GEJob("ls", binary=True, name="merge"))["slot"], 1)
+
+    def test_failed_runs_ignored(self):
+        self.assertIsNone(self.history.suggest(GEJob("ls", binary=True, name="sort")))
+
+    def test_apply(self):
+        align = GEJob("ls", binary=True, name="align")
+        merge = GEJob("ls", binary=True, name="merge", slot=4)
+        right_size(GESeriesJob([align, merge]), self.history, apply=True, override=True, out=None)
+        self.assertEqual(align.resource, dict(s_vmem="308M", mem_req="308M", h_rt="12"))
+        self.assertEqual(align.parallel_env, dict(def_slot=[8]))
+        self.assertEqual(job_slots(merge), 1)
+        self.assertEqual(merge.resource["s_vmem"], "{}M".format(-(-int(math.ceil(100 * MB * 1.2)) // MB)))
+
+    def test_user_slots_kept(self):
+        # memory is divided among the 4 slots the job keeps, not the 8 suggested
+        job = GEJob("ls", binary=True, name="align", slot=4)
+        right_size(job, self.history, apply=True, out=None)
+        self.assertEqual(job.parallel_env, dict(def_slot=[4]))
+        self.assertEqual(job.resource["s_vmem"], "615M")
+
+
+if __name__ == "__main__":
+    unittest.main()
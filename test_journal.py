@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+import unittest
+import subprocess
+from os import path
+
+import events
+import monitor
+from piperunner import GEJob, GEParallelJob
+from backend import FakeBackend
+from submitter import Submitter
+from journal import GEJournal, SUBMITTED
+from monitor import GEMonitor, PENDING, RUNNING, DONE, FAILED, UNKNOWN
+
+FIXTURES = path.join(path.dirname(path.abspath(__file__)), "fixtures")
+
+
+def fixture(name):
+    with open(path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+class ReportSink(events.Sink):
+    events = (events.REPORT,)
+
+    def __init__(self):
+        self.reports = {}
+
+    def __call__(self, event):
+        self.reports[event["name"]] = (event["status"], event["job_id"])
+
+
+def pipeline():
+    return GEParallelJob([GEJob("ls", args=[name], binary=True, name=name)
+                          for name in ("running", "pending", "done", "failed", "unknown")])
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal_path = path.join(self.directory, "pipeline.journal")
+        self.backend = FakeBackend()
+        self.qacct = {3: fixture("qacct_done.txt"), 4: fixture("qacct_failed.txt")}
+        self.monitor = GEMonitor(qstat=lambda: "<job_info/>", qacct=self.run_qacct)
+        self.default_monitor = monitor.get_monitor()
+        monitor.set_monitor(self.monitor)
+        events.remove_sink(events.console)
+        self.sink = events.add_sink(ReportSink())
+
+        Submitter(backend=self.backend, journal=self.journal()).submit(pipeline())
+        self.backend.finish(1, RUNNING)
+        for job_id in (3, 4, 5):
+            self.backend.delete([job_id])  # gone from qstat
+
+    def tearDown(self):
+        events.remove_sink(self.sink)
+        events.add_sink(events.console)
+        monitor.set_monitor(self.default_monitor)
+        shutil.rmtree(self.directory)
+
+    def run_qacct(self, job_id):
+        if job_id not in self.qacct:
+            raise subprocess.CalledProcessError(1, "qacct", "error: job id {} not found".format(job_id))
+        return self.qacct[job_id]
+
+    def journal(self):
+        return GEJournal(self.journal_path, backend=self.backend, monitor=self.monitor)
+
+    def test_states(self):
+        journal = self.journal()
+        self.assertEqual(sorted(entry["state"] for entry in journal.entries.values()), [SUBMITTED] * 5)
+
+        jobs = pipeline().jobs
+        journal.refresh(journal.keys(jobs))
+        states = dict((entry["name"], entry["state"]) for entry in self.journal().entries.values())
+        self.assertEqual(states, dict(running=RUNNING, pending=PENDING, done=DONE, failed=FAILED, unknown=UNKNOWN))
+
+    def test_resubmission(self):
+        Submitter(backend=self.backend, journal=self.journal()).submit(pipeline())
+        self.assertEqual(self.sink.reports, dict(
+            running=("REUSED", 1), pending=("REUSED", 2), done=("SKIPPED", 3),
+            failed=("SUBMITTED", 6), unknown=("REUSED", 5)
+        ))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import subprocess
+from os import path
+
+from piperunner import GEJob
+from monitor import (GEMonitor, parse_qstat_xml, parse_qstat_times, parse_qacct, record2state, parse_tasks,
+                     count_tasks, PENDING, RUNNING, ERROR, DONE, FAILED, UNKNOWN)
+
+FIXTURES = path.join(path.dirname(path.abspath(__file__)), "fixtures")
+
+
+def fixture(name):
+    with open(path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def submitted(job_id):
+    job = GEJob("ls", binary=True)
+    job.job_id = job_id
+    return job
+
+
+class ParseTest(unittest.TestCase):
+    def test_qstat_states(self):
+        states = parse_qstat_xml(fixture("qstat.xml"))
+        self.assertEqual(states[(101, None)], RUNNING)
+        self.assertEqual([states[(102, task)] for task in (1, 2, 3, 10)], [RUNNING, RUNNING, PENDING, PENDING])
+        self.assertEqual(len([key for key in states if key[0] == 102]), 10)
+        self.assertEqual(states[(103, None)], ERROR)
+        self.assertEqual(states[(104, None)], PENDING)
+
+    def test_qstat_times(self):
+        jobs = parse_qstat_times(fixture("qstat.xml"))
+        self.assertEqual(jobs[101][0], "align")
+        self.assertEqual(jobs[104][1] - jobs[103][1], 2)
+
+    def test_qacct_states(self):
+        records = parse_qacct(fixture("qacct_array.txt"))
+        self.assertEqual([record["taskid"] for record in records], ["1", "2"])
+        self.assertEqual(map(record2state, records), [DONE, FAILED])
+        self.assertEqual(map(record2state, parse_qacct(fixture("qacct_failed.txt"))), [FAILED])
+
+    def test_count_tasks(self):
+        for tasks in ("1-10:3,20", "5", "1-100000", "2-9:2,11-13"):
+            self.assertEqual(count_tasks(tasks), len(parse_tasks(tasks)))
+        self.assertEqual(count_tasks(None), 0)
+
+
+class PollTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.qacct = {106: fixture("qacct_array.txt")}
+        self.monitor = GEMonitor(qstat=lambda: fixture("qstat.xml"), qacct=self.run_qacct, clock=lambda: self.now)
+
+    def run_qacct(self, job_id):
+        if job_id not in self.qacct:
+            raise subprocess.CalledProcessError(1, "qacct", "error: job id {} not found".format(job_id))
+        return self.qacct[job_id]
+
+    def test_array_followed_as_whole(self):
+        self.monitor.track(submitted(102))
+        self.monitor.poll()
+        self.assertEqual(self.monitor.states, {(102, None): RUNNING})
+
+    def test_finished_from_accounting(self):
+        for job_id in (106, 107):
+            self.monitor.track(submitted(job_id))
+        self.monitor.poll()
+        self.assertEqual(self.monitor.state(106), FAILED)
+        self.assertEqual(self.monitor.state(107), UNKNOWN)  # accounting not written yet
+
+    def test_queue_wait(self):
+        for job_id in (101, 104):
+            self.monitor.track(submitted(job_id))
+        self.now = 30
+        self.monitor.poll()
+        self.assertEqual(list(self.monitor.queue_waits), [30])
+
+    def test_wait(self):
+        self.qacct[108] = fixture("qacct_done.txt")
+        self.monitor.interval = 0
+        self.assertEqual(self.monitor.wait((108, [None]), timeout=5), {(108, None): DONE})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from piperunner import GESeriesJob, GEParallelJob, GEDAGJob
+from qsubparse import iter_commands, script2pipeline
+
+
+def script(text):
+    return text.splitlines(True)
+
+
+class IterCommandsTest(unittest.TestCase):
+    def test_capture_followed_by_more_shell(self):
+        commands = list(iter_commands(script(
+            "JID=$(qsub -terse -N a ls) || exit 1\n"
+            "X=$(qsub -terse -N b ls) # note\n"
+            "Y=\"$(qsub -terse -N c ls | cut -d. -f1)\"\n"
+            "Z=`qsub -N d ls`\n"
+        )))
+        self.assertEqual([variable for variable, _ in commands], ["JID", "X", "Y", "Z"])
+        self.assertEqual(commands[2][1], ["-terse", "-N", "c", "ls"])
+
+    def test_control_and_redirection_dropped(self):
+        commands = list(iter_commands(script(
+            "qsub -N e ls > /dev/null\n"
+            "qsub -N f ls && echo ok\n"
+            "qsub -N g 2>/dev/null ls -l; echo done\n"
+            "qsub -N h -v 'A=x > y' ls 2>&1 >> log &\n"
+        )))
+        self.assertEqual([words for _, words in commands], [
+            ["-N", "e", "ls"], ["-N", "f", "ls"], ["-N", "g", "ls", "-l"], ["-N", "h", "-v", "A=x > y", "ls"],
+        ])
+
+    def test_continued_lines_and_other_commands(self):
+        commands = list(iter_commands(script("echo start\nqsub -N a \\\n  ls -l\n# qsub -N old ls\n")))
+        self.assertEqual(commands, [(None, ["-N", "a", "ls", "-l"])])
+
+    def test_unreadable_qsub_raises(self):
+        for line in ("if qsub -N a ls; then", "echo x | qsub -N a"):
+            self.assertRaises(ValueError, list, iter_commands([line]))
+
+
+class Script2PipelineTest(unittest.TestCase):
+    def test_chain_by_variable(self):
+        pipeline = script2pipeline(script(
+            "A=$(qsub -terse -N a ls) || exit 1\n"
+            "B=$(qsub -terse -N b -hold_jid $A ls) # after a\n"
+            "qsub -N c -hold_jid $B ls > /dev/null\n"
+        ))
+        self.assertIsInstance(pipeline, GESeriesJob)
+        self.assertEqual([job.name for job in pipeline.jobs], ["a", "b", "c"])
+
+    def test_independent_jobs(self):
+        pipeline = script2pipeline(script("qsub -N a ls && echo ok\nqsub -N b ls\n"))
+        self.assertIsInstance(pipeline, GEParallelJob)
+
+    def test_dag_by_name(self):
+        pipeline = script2pipeline(script(
+            "qsub -N a ls\nqsub -N b ls\nqsub -N c -hold_jid a,b ls\nqsub -N d -hold_jid_ad c,other ls\n"
+        ))
+        self.assertIsInstance(pipeline, GEDAGJob)
+        c, d = pipeline.jobs[2:]
+        self.assertEqual(sorted(upstream.name for upstream, _ in pipeline.deps[c]), ["a", "b"])
+        self.assertEqual(pipeline.deps[d], [(c, True)])
+        self.assertEqual(d.hold_jid_ad, ["other"])
+
+
+if __name__ == "__main__":
+    unittest.main()
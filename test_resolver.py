@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os import path
+
+import resolver
+from piperunner import GEJob, GEParallelJob
+from backend import FakeBackend
+
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.command = path.join(self.directory, "tool")
+        resolver.clear_cache()
+
+    def tearDown(self):
+        resolver.clear_cache()
+        shutil.rmtree(self.directory)
+
+    def test_results_cached(self):
+        self.assertFalse(resolver.command_exists(self.command))
+        open(self.command, 'w').close()
+        self.assertFalse(resolver.command_exists(self.command))  # misses are cached too
+        resolver.clear_cache()
+        self.assertTrue(resolver.command_exists(self.command))
+
+    def test_cache_keyed_by_path(self):
+        open(self.command, 'w').close()
+        old_path = os.environ["PATH"]
+        try:
+            self.assertFalse(resolver.command_exists("tool"))
+            os.environ["PATH"] = self.directory + path.pathsep + old_path
+            self.assertTrue(resolver.command_exists("tool"))
+        finally:
+            os.environ["PATH"] = old_path
+
+    def test_missing_listed_once(self):
+        with self.assertRaises(IOError) as context:
+            resolver.check_commands(["ls", "no-such-b", "no-such-a", "no-such-b"])
+        self.assertEqual(str(context.exception), "Script/Binary not found: no-such-a, no-such-b")
+
+
+class LazyCheckTest(unittest.TestCase):
+    def setUp(self):
+        self.lazy_check = GEJob.lazy_check
+
+    def tearDown(self):
+        GEJob.lazy_check = self.lazy_check
+
+    def test_checked_at_submission(self):
+        self.assertRaises(IOError, GEJob, "no-such-command-gerunner", binary=True)
+
+        GEJob.lazy_check = True
+        pipeline = GEParallelJob([GEJob("ls", binary=True), GEJob("no-such-command-gerunner", binary=True)])
+        backend = FakeBackend()
+        self.assertRaises(IOError, pipeline.submit, backend=backend)
+        self.assertEqual(backend.order, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
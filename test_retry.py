@@ -0,0 +1,82 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from os import path
+
+from piperunner import GEArrayJob
+from argtable import TaskStatus
+from monitor import parse_qacct
+from retry import failed_rows, retry_failed
+
+FIXTURES = path.join(path.dirname(path.abspath(__file__)), "fixtures")
+
+
+def fixture(name):
+    with open(path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def run_task(job, task):
+    env = dict(os.environ, SGE_TASK_ID=str(task), SGE_TASK_LAST=str(job.ntasks), NSLOTS="1")
+    return subprocess.call([sys.executable] + job.args, env=env)
+
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = [path.join(self.directory, "file{}".format(i)) for i in range(6)]
+        for filename in self.files[::2]:
+            open(filename, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_job(self, per_task=2, **kwargs):
+        job = GEArrayJob("test", args=["-e", "{1}"], arg1=self.files, per_task=per_task, mem="1G",
+                         table_dir=self.directory, **kwargs)
+        for task in xrange(1, job.ntasks + 1):
+            run_task(job, task)
+        return job
+
+    def test_only_failed_rows(self):
+        job = self.run_job()
+        self.assertEqual(failed_rows(job), [1, 3, 5])
+
+        retry = retry_failed(job, per_task=2)
+        self.assertEqual((retry.ntasks, retry.array, retry.attempt), (2, "1-2", 1))
+        self.assertEqual(retry.resource["s_vmem"], "1536M")
+        self.assertEqual(job.resource["s_vmem"], "1G")
+
+        open(self.files[1], 'w').close()
+        for task in (1, 2):
+            run_task(retry, task)
+        self.assertEqual(TaskStatus(job.status).read(6), [0, 0, 0, 1, 0, 1])
+        self.assertEqual(failed_rows(retry), [3, 5])
+
+        second = retry_failed(retry, budget=2)
+        self.assertEqual(second.attempt, 2)
+        self.assertRaises(IOError, retry_failed, second, budget=2)
+
+    def test_aligned(self):
+        job = self.run_job()
+        retry = retry_failed(job, aligned=True)
+        self.assertEqual((retry.ntasks, retry.array), (job.ntasks, job.array))
+        self.assertIn("--skip-done", retry.args)
+
+        for filename in self.files:
+            open(filename, 'w').close()
+        for task in (1, 2, 3):
+            run_task(retry, task)
+        self.assertIsNone(retry_failed(retry))
+
+    def test_from_accounting(self):
+        job = self.run_job(per_task=3)
+        os.remove(job.status)
+        self.assertEqual(failed_rows(job, parse_qacct(fixture("qacct_array.txt"))), [3, 4, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import unittest
+
+import events
+import monitor
+from piperunner import GEJob, GESeriesJob
+from backend import FakeBackend
+from router import GERouter, LOCAL_ID_BASE
+from monitor import GEMonitor, PENDING, DONE
+
+
+def job(name, resource=None, **kwargs):
+    return GEJob("true", binary=True, name=name, resource=resource, **kwargs)
+
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.monitor = monitor.get_monitor()
+        monitor.set_monitor(GEMonitor(qstat=lambda: "<job_info/>", qacct=lambda job_id: ''))
+        self.router = GERouter(self.backend, default_runtime=1, queue_wait=60, interval=0.01, monitor=monitor.get_monitor())
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+        monitor.set_monitor(self.monitor)
+
+    def test_route(self):
+        self.assertTrue(self.router.route(job("small"))[0])
+        self.assertFalse(self.router.route(job("big", {"h_vmem": "8G"}))[0])
+        self.assertFalse(self.router.route(job("array", array="1-10"))[0])
+        self.assertFalse(self.router.route(job("by_name", hold_jid="small"))[0])
+        self.router.queue_wait = 0
+        self.assertFalse(self.router.route(job("small"))[0])
+
+    def test_local_ids(self):
+        first, second = job("first"), job("second")
+        for each in (first, second):
+            each._build_command()
+        self.assertEqual(self.router.submit(first.commandline, first), "{}\n".format(LOCAL_ID_BASE))
+        self.assertEqual(self.router.submit(second.commandline, second), "{}\n".format(LOCAL_ID_BASE + 1))
+        self.assertEqual(self.router.submit(first.commandline), "1\n")  # no job to judge: cluster
+        self.router.join()
+        self.assertEqual(self.backend.order, [1])
+        self.assertEqual(self.router.status([LOCAL_ID_BASE, LOCAL_ID_BASE + 1, 1]),
+                         {(LOCAL_ID_BASE, None): DONE, (LOCAL_ID_BASE + 1, None): DONE, (1, None): PENDING})
+
+    def test_holds_across_cluster_and_local(self):
+        before, local, after = job("before", {"h_vmem": "8G"}), job("local"), job("after", {"h_vmem": "8G"})
+        GESeriesJob([before, local, after]).submit(backend=self.router)
+        self.assertEqual((before.job_id, local.job_id, after.job_id), (1, LOCAL_ID_BASE, 2))
+
+        # after holds on the local job with -h instead of -hold_jid, which GridEngine would not know
+        self.assertTrue(self.backend.jobs[2]["held"])
+        self.assertEqual(self.backend.jobs[2]["hold_jid"], [])
+
+        # the local job waits for the cluster job it holds on
+        time.sleep(0.05)
+        self.assertEqual(self.router.local[LOCAL_ID_BASE].state, PENDING)
+        self.backend.finish(1)
+        self.router.join()
+        self.assertEqual(monitor.get_monitor().state(LOCAL_ID_BASE), DONE)
+        self.assertFalse(self.backend.jobs[2]["held"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import shutil
+import tempfile
+import unittest
+
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob
+from simulator import Cluster, simulate
+
+
+def job(name, **kwargs):
+    return GEJob("ls", binary=True, name=name, **kwargs)
+
+
+class SimulateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def array(self, name, ntasks):
+        return GEArrayJob("echo", args=["{1}"], arg1=range(ntasks), name=name, table_dir=self.directory)
+
+    def test_slots_shared(self):
+        pipeline = GESeriesJob([GEParallelJob([job("a{}".format(i)) for i in range(4)]), job("last")])
+        result = simulate(pipeline, {"last": 5}, Cluster(hosts=1, slots=2), default=10)
+        self.assertEqual(result.makespan, 25)
+        self.assertEqual([stage.name for stage in result.bottlenecks][-1], "last")
+
+    def test_array_dependency_pipelines_tasks(self):
+        first, second = self.array("first", 4), self.array("second", 4)
+        estimates = {"first": 10, "second": 10}
+        whole = simulate(GESeriesJob([first, second]), estimates, Cluster(hosts=1, slots=2))
+        by_task = simulate(GESeriesJob([self.array("first", 4), self.array("second", 4)], as_array=True),
+                           estimates, Cluster(hosts=1, slots=2))
+        self.assertEqual(whole.makespan, 40)
+        self.assertLessEqual(by_task.makespan, whole.makespan)
+        self.assertEqual(whole.mean_utilisation, 1.0)
+
+    def test_memory_limits_hosts(self):
+        jobs = [job("big{}".format(i), resource={"h_vmem": "3G"}) for i in range(2)]
+        self.assertEqual(simulate(GEParallelJob(jobs), cluster=Cluster(hosts=1, slots=2, mem="4G")).makespan, 2)
+        self.assertEqual(simulate(GEParallelJob(jobs), cluster=Cluster(hosts=2, slots=1, mem="4G")).makespan, 1)
+        self.assertRaises(ValueError, simulate, jobs[0], cluster=Cluster(mem="2G"))
+
+
+if __name__ == "__main__":
+    unittest.main()
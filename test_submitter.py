@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import unittest
+
+import events
+import monitor
+from piperunner import GEJob, GEArrayJob, GESeriesJob, GEParallelJob
+from backend import FakeBackend
+from submitter import JobGraph
+
+
+class ReportSink(events.Sink):
+    events = (events.REPORT,)
+
+    def __init__(self):
+        self.names = []
+
+    def __call__(self, event):
+        self.names.append(event["name"])
+
+
+class SubmitTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = FakeBackend()
+        self.monitor = monitor.get_monitor()
+        monitor.set_monitor(monitor.GEMonitor(qstat=lambda: "<job_info/>", qacct=lambda job_id: ''))
+        events.remove_sink(events.console)
+
+    def tearDown(self):
+        events.add_sink(events.console)
+        monitor.set_monitor(self.monitor)
+        shutil.rmtree(self.directory)
+
+    def test_next_job(self):
+        first = GEJob("ls", binary=True, name="first")
+        second = GEJob("ls", binary=True, name="second")
+        third = GEJob("ls", binary=True, name="third")
+        first.append_next_job(second)
+        first.append_next_job(third)
+        first.submit(backend=self.backend)
+
+        self.assertEqual(self.backend.order, [1, 2, 3])
+        self.assertEqual(self.backend.jobs[second.job_id]["hold_jid"], [str(first.job_id)])
+        self.assertEqual(self.backend.jobs[third.job_id]["hold_jid"], [str(first.job_id)])
+        self.assertEqual(sorted(monitor.get_monitor().states), [(1, None), (2, None), (3, None)])
+
+    def test_array_tracked_once(self):
+        job = GEArrayJob("echo", args=["{1}"], arg1=range(500), table_dir=self.directory)
+        job.submit(backend=self.backend)
+        self.assertEqual(job.array, "1-500:1")
+        self.assertEqual(monitor.get_monitor().states.keys(), [(job.job_id, None)])
+
+    def test_stage_join(self):
+        upstream = [GEJob("ls", binary=True, name="up{}".format(i)) for i in range(3)]
+        downstream = [GEJob("ls", binary=True, name="down{}".format(i)) for i in range(3)]
+        pipeline = GESeriesJob([GEParallelJob(upstream), GEParallelJob(downstream)])
+
+        graph = JobGraph.from_pipeline(pipeline)
+        self.assertEqual(len(graph.joins), 1)
+        self.assertEqual(sum(len(deps) for deps in graph.deps.values()), 6)
+
+        pipeline.submit(backend=self.backend)
+        for job in downstream:
+            self.assertEqual(sorted(self.backend.jobs[job.job_id]["hold_jid"]), ['1', '2', '3'])
+
+    def test_concurrent_submission(self):
+        sink = events.add_sink(ReportSink())
+        try:
+            branches = [GESeriesJob([GEJob("ls", binary=True, name="{}{}".format(step, i)) for step in "abc"])
+                        for i in range(8)]
+            GEParallelJob(branches).submit(workers=4, backend=self.backend)
+        finally:
+            events.remove_sink(sink)
+
+        self.assertEqual(len(self.backend.order), 24)
+        for branch in branches:
+            for upstream, job in zip(branch.jobs, branch.jobs[1:]):
+                self.assertEqual(self.backend.jobs[job.job_id]["hold_jid"], [str(upstream.job_id)])
+                self.assertLess(self.backend.order.index(upstream.job_id), self.backend.order.index(job.job_id))
+        self.assertEqual(sink.names, [job.name for branch in branches for job in branch.jobs])
+
+
+if __name__ == "__main__":
+    unittest.main()
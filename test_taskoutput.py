@@ -0,0 +1,46 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from piperunner import GEJob, GEArrayJob
+from argtable import TaskStatus
+from taskoutput import TaskOutput
+
+
+def run_task(job, task):
+    env = dict(os.environ, SGE_TASK_ID=str(task), SGE_TASK_LAST=str(job.ntasks), NSLOTS="2")
+    return subprocess.call([sys.executable] + job.args, env=env)
+
+
+class CaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lazy_check = GEJob.lazy_check
+        GEJob.lazy_check = True  # the command is taken from the table
+
+    def tearDown(self):
+        GEJob.lazy_check = self.lazy_check
+        shutil.rmtree(self.directory)
+
+    def test_rows_captured(self):
+        job = GEArrayJob("{1}", args=["{2}"], arg1=["echo", "echo", "no-such-command-gerunner"],
+                         arg2=["a", "b", "c"], name="capture", per_task=2, capture=True, table_dir=self.directory)
+        self.assertEqual(job.stderr, [job.table + ".err"])
+        self.assertEqual(job.stdout, ["/dev/null"])
+
+        self.assertEqual([run_task(job, task) for task in (1, 2)], [0, 127])
+        output = TaskOutput(job)
+        self.assertEqual(output.get(0), ("a\n", ''))
+        self.assertEqual(output.get(1), ("b\n", ''))
+        stdout, stderr = output.get(2)
+        self.assertEqual(stdout, '')
+        self.assertIn("cannot run no-such-command-gerunner", stderr)
+        self.assertEqual([row for row, _, _ in output], [0, 1, 2])
+        self.assertEqual(TaskStatus(job.status).read(3), [0, 0, 127])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from piperunner import GEArrayJob
+from argtable import TaskStats
+from taskstats import load_stats, summarise, outliers, failures
+
+
+def run_task(job, task):
+    env = dict(os.environ, SGE_TASK_ID=str(task), SGE_TASK_LAST=str(job.ntasks), NSLOTS="2")
+    return subprocess.call([sys.executable] + job.args, env=env)
+
+
+class ProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rows_recorded(self):
+        job = GEArrayJob("sh", args=["-c", "{1}"], arg1=["true", "exit 3", "sleep 0.2"], per_task=3,
+                         profile=True, table_dir=self.directory)
+        self.assertIn("--stats", job.args)
+        run_task(job, 1)
+
+        records = load_stats(job)
+        self.assertEqual([row for row, _, _ in records], [0, 1, 2])
+        self.assertEqual([stats["exit_status"] for _, _, stats in records], [0, 3, 0])
+        self.assertEqual(records[2][2]["task"], 1)
+        self.assertGreaterEqual(records[2][2]["wall"], 0.2)
+        self.assertEqual([args for row, args, _ in failures(job)], [("exit 3",)])
+        self.assertEqual(summarise(job)["wall"]["count"], 3)
+
+    def test_not_profiled(self):
+        job = GEArrayJob("echo", args=["{1}"], arg1=range(3), table_dir=self.directory)
+        self.assertRaises(ValueError, load_stats, job)
+
+    def test_outliers(self):
+        job = GEArrayJob("echo", args=["{1}", "{2}"], arg1=["a"] * 4 + ["slow"], arg2=range(5),
+                         profile=True, table_dir=self.directory)
+        stats = TaskStats(job.stats)
+        for row, wall in enumerate([1.0, 1.0, 1.0, 1.0, 10.0]):
+            stats.set(row, 0, row + 1, 0.0, wall, 0.0, 0.0, 1024, "host")
+        stats.close()
+        self.assertEqual(outliers(job), [("slow", 1, 10.0)])
+        self.assertEqual(outliers(job, axis=0, factor=20.0), [])
+
+
+if __name__ == "__main__":
+    unittest.main()